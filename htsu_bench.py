@@ -0,0 +1,330 @@
+###############################################################################
+# Name: htsu_bench.py
+#
+# Purpose: Benchmarks of the hot paths on synthetic resource layers of increasing size:
+#          the step sampler (htsu_kernel/htsu_sample), the walker ensemble
+#          (htsu_ensemble), the Barnett-Moorcroft integral (htsu_bm), one step of the
+#          master equation (htsu_me), the interacting walkers (htsu_interact), the KDE
+#          (htsu_kde) and the home-range search (htsu_homerange).
+#
+#          On the smaller layers each one is also checked against a reference
+#          calculation written as the original scripts did it (the per-cell loops of
+#          htsu_sim_path_ex1.py, htsu_me_ex1.py, htsu_sim_2indivs.py and htsu_fig2.py,
+#          the direct Barnett-Moorcroft sum of htsu_bm_ud_ex1.py and the sum over
+#          every position of the htsu_fig3.py KDE), and the largest difference is
+#          recorded, together with the time the reference took.
+#
+#          Results are written as JSON, so that runs on different versions can be
+#          compared with python htsu_bench.py compare old.json new.json, which lists
+#          the benchmarks that have become slower by more than a given factor.
+#
+# Usage: To run this, use the following command
+#   python htsu_bench.py bench.json
+# or, for chosen layer sizes,
+#   python htsu_bench.py bench.json 50 100 200
+# and to compare two runs, flagging anything more than 1.2 times slower,
+#   python htsu_bench.py compare old.json new.json 1.2
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys, math, json, time, platform
+import numpy
+import htsu_kernel, htsu_sample, htsu_ensemble, htsu_bm, htsu_me, htsu_interact, htsu_kde, htsu_homerange
+
+# Layer sizes (width = height) benchmarked by default
+SIZES = [50, 100, 200, 500, 1000, 2000]
+
+# Largest layer on which each benchmark is checked against its reference, which is
+# either a per-cell Python loop or needs O(N^2) time or memory
+REFERENCE_MAX = {'step_sampler': 100, 'ensemble': 100, 'bm_ud': 100, 'me_step': 50,
+                 'interact': 100, 'kde': 500, 'home_range': 100}
+
+# Number of times each benchmark is timed; the fastest is kept
+REPEATS = 3
+
+# Parameters of the movement kernel and of the simulations
+BETA_R = 1.5
+LAMBDA_VAL = 0.2
+TOLERANCE = 1e-6
+SAMPLER_STEPS = 200
+ENSEMBLE_WALKERS = 1000
+ENSEMBLE_STEPS = 10
+INTERACT_INDIVS = 2
+INTERACT_STEPS = 2000
+KDE_POINTS = 20000
+
+
+# Synthetic resource layer: white noise smoothed by a Gaussian of width smoothing cells
+# (by FFT, with periodic boundaries) and scaled to zero mean and unit variance, like
+# random_field_100.inp
+def synthetic_layer(size, seed=0, smoothing=5.0):
+    noise = numpy.random.default_rng(seed).standard_normal((size, size))
+    freq = numpy.fft.fftfreq(size)
+    gaussian = numpy.exp(-2*(math.pi*smoothing)**2*(freq[:,numpy.newaxis]**2 + freq[numpy.newaxis,:]**2))
+    layer = numpy.fft.ifft2(numpy.fft.fft2(noise)*gaussian).real
+    return (layer - layer.mean())/layer.std()
+
+
+# Fastest of REPEATS runs of function(), returning the time and the last result
+def best_time(function, repeats=REPEATS):
+    best = math.inf
+    for repeat in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start_time)
+    return best, result
+
+
+# Reference step sampler, as in the original htsu_sim_path_ex1.py: the cumulative
+# distribution of the movement kernel is built cell by cell for each step, and the first
+# cell whose normalised cumulative weight exceeds the random number is taken
+def reference_path(exp_layer, lambda_val, start, random_nos):
+    loc_x = [start[0]]
+    loc_y = [start[1]]
+    for random_no in random_nos:
+        cum_dist = []
+        cum_val = 0
+        for y_val in range(len(exp_layer)):
+            for x_val in range(len(exp_layer[y_val])):
+                cum_val += (math.exp(-lambda_val*math.sqrt((float(x_val-loc_x[-1]))**2+(float(y_val-loc_y[-1]))**2))*
+                            exp_layer[y_val][x_val])
+                cum_dist += [(cum_val, x_val, y_val)]
+        for cum_prob, x_val, y_val in cum_dist:
+            if cum_prob/cum_val > random_no:
+                break
+        loc_x += [x_val]
+        loc_y += [y_val]
+    return loc_x, loc_y
+
+
+# The step sampler of htsu_sim_path_ex1.py, with the kernel tabulated once
+def sampled_path(kernel, exp_layer, start, random_nos):
+    box_height, box_width = exp_layer.shape
+    loc_x = [start[0]]
+    loc_y = [start[1]]
+    for random_no in random_nos:
+        kernel_window, (y0, y1, x0, x1) = kernel.window(loc_x[-1], loc_y[-1], box_width, box_height)
+        y_val, x_val = htsu_sample.draw_cell(kernel_window*exp_layer[y0:y1, x0:x1], random_no)
+        loc_x += [x0 + x_val]
+        loc_y += [y0 + y_val]
+    return loc_x, loc_y
+
+
+def bench_step_sampler(exp_layer, reference):
+    size = len(exp_layer)
+    random_nos = numpy.random.default_rng(1).random(SAMPLER_STEPS)
+    kernel = htsu_kernel.StepKernel(LAMBDA_VAL, size, size, tolerance=TOLERANCE)
+    seconds, path = best_time(lambda: sampled_path(kernel, exp_layer, (size//2, size//2), random_nos))
+    result = {'seconds': seconds, 'units': SAMPLER_STEPS, 'unit': 'steps'}
+    if reference:
+        # Untruncated kernel, so that the same random numbers should give the same path
+        full_kernel = htsu_kernel.StepKernel(LAMBDA_VAL, size, size)
+        ref_steps = 10
+        path = sampled_path(full_kernel, exp_layer, (size//2, size//2), random_nos[:ref_steps])
+        result['reference_seconds'], ref_path = best_time(
+            lambda: reference_path(exp_layer.tolist(), LAMBDA_VAL, (size//2, size//2), random_nos[:ref_steps]), 1)
+        result['reference_seconds'] *= SAMPLER_STEPS/float(ref_steps)
+        result['max_error'] = float(numpy.abs(numpy.subtract(path, ref_path)).max())
+    return result
+
+
+def bench_ensemble(exp_layer, reference):
+    size = len(exp_layer)
+    seconds, locations = best_time(lambda: htsu_ensemble.simulate_ensemble(
+        exp_layer, LAMBDA_VAL, ENSEMBLE_WALKERS, ENSEMBLE_STEPS, tolerance=TOLERANCE, seed=1))
+    result = {'seconds': seconds, 'units': ENSEMBLE_WALKERS*(ENSEMBLE_STEPS-1), 'unit': 'walker steps'}
+    if reference:
+        # Walker by walker with the untruncated kernel, reading the random numbers that
+        # simulate_ensemble draws (one per walker per step)
+        ref_walkers = 5
+        locations = htsu_ensemble.simulate_ensemble(exp_layer, LAMBDA_VAL, ref_walkers, 3, tolerance=None, seed=1)
+        random_nos = numpy.random.default_rng(1).random((2, ref_walkers))
+        start_time = time.perf_counter()
+        ref_paths = [reference_path(exp_layer.tolist(), LAMBDA_VAL, locations[walker][0], random_nos[:,walker])
+                     for walker in range(ref_walkers)]
+        result['reference_seconds'] = ((time.perf_counter() - start_time)*
+                                       ENSEMBLE_WALKERS*(ENSEMBLE_STEPS-1)/float(2*ref_walkers))
+        result['max_error'] = float(max(numpy.abs(locations[walker] - numpy.transpose(ref_paths[walker])).max()
+                                        for walker in range(ref_walkers)))
+    return result
+
+
+def bench_bm_ud(exp_layer, reference):
+    seconds, ud = best_time(lambda: htsu_bm.bm_ud(exp_layer, LAMBDA_VAL))
+    result = {'seconds': seconds, 'units': exp_layer.size, 'unit': 'cells'}
+    if reference:
+        result['reference_seconds'], ref_ud = best_time(lambda: htsu_bm.bm_ud_direct(exp_layer, LAMBDA_VAL), 1)
+        result['max_error'] = float(numpy.abs(ud - ref_ud).max()/ref_ud.max())
+    return result
+
+
+def bench_me_step(exp_layer, reference):
+    size = len(exp_layer)
+    master_eq = htsu_me.MasterEquation(exp_layer, LAMBDA_VAL)
+    ud_array = numpy.zeros(exp_layer.shape)
+    ud_array[size//2][size//2] = 1
+    ud_array = master_eq.propagate(ud_array, 5)
+    seconds, next_ud = best_time(lambda: master_eq.step(ud_array))
+    result = {'seconds': seconds, 'units': exp_layer.size, 'unit': 'cells'}
+    if reference:
+        # Dense P(s|s'), as tabulated by the original htsu_me_ex1.py
+        grid_y, grid_x = numpy.mgrid[0:size, 0:size]
+        phi = numpy.exp(-LAMBDA_VAL*numpy.hypot(grid_x.ravel()[:,numpy.newaxis] - grid_x.ravel()[numpy.newaxis,:],
+                                                grid_y.ravel()[:,numpy.newaxis] - grid_y.ravel()[numpy.newaxis,:]))
+        kernel = phi*exp_layer.ravel()[:,numpy.newaxis]
+        kernel /= kernel.sum(axis=0)[numpy.newaxis,:]
+        result['reference_seconds'], ref_ud = best_time(lambda: numpy.dot(kernel, ud_array.ravel()), 1)
+        result['max_error'] = float(numpy.abs(next_ud.ravel() - ref_ud).max()/ref_ud.max())
+    return result
+
+
+# Reference interacting walkers, as in the original htsu_sim_2indivs.py: each individual
+# in turn tries its four moves cell by cell, and the ODs are updated once all have moved
+def reference_interact(exp_layer, start, beta_interact, no_steps_for_od, random_nos):
+    box_height, box_width = exp_layer.shape
+    no_indivs = len(start)
+    dec_inc = 1/float(no_steps_for_od)
+    loc_x = [start[indiv][0] for indiv in range(no_indivs)]
+    loc_y = [start[indiv][1] for indiv in range(no_indivs)]
+    occurrence_dist = numpy.zeros((no_indivs, box_height, box_width))
+    history = [[(loc_x[indiv], loc_y[indiv])] for indiv in range(no_indivs)]
+    for indiv in range(no_indivs):
+        occurrence_dist[indiv][loc_y[indiv]][loc_x[indiv]] = 1
+    locations = []
+    for step in range(len(random_nos)):
+        for indiv in range(no_indivs):
+            probs = [0.0, 0.0, 0.0, 0.0]
+            for move in range(4):
+                new_x = loc_x[indiv] + int(htsu_interact.MOVES_X[move])
+                new_y = loc_y[indiv] + int(htsu_interact.MOVES_Y[move])
+                if 0 <= new_x < box_width and 0 <= new_y < box_height:
+                    others_od = occurrence_dist[:,new_y,new_x].sum() - occurrence_dist[indiv][new_y][new_x]
+                    probs[move] = exp_layer[new_y][new_x]*math.exp(-beta_interact*others_od)
+            target = random_nos[step][indiv]*sum(probs)
+            move = 0
+            cum_prob = probs[0]
+            while cum_prob <= target and move < 3:
+                move += 1
+                cum_prob += probs[move]
+            loc_x[indiv] += int(htsu_interact.MOVES_X[move])
+            loc_y[indiv] += int(htsu_interact.MOVES_Y[move])
+        for indiv in range(no_indivs):
+            if step + 1 < no_steps_for_od:
+                first_x, first_y = history[indiv][0]
+            else:
+                first_x, first_y = history[indiv].pop(0)
+            occurrence_dist[indiv][first_y][first_x] -= dec_inc
+            occurrence_dist[indiv][loc_y[indiv]][loc_x[indiv]] += dec_inc
+            history[indiv].append((loc_x[indiv], loc_y[indiv]))
+        locations += [list(zip(loc_x, loc_y))]
+    return numpy.array(locations)
+
+
+def bench_interact(exp_layer, reference):
+    no_steps_for_od = INTERACT_STEPS//2
+    walkers = htsu_interact.InteractingWalkers(exp_layer, INTERACT_INDIVS, 1.0, no_steps_for_od, seed=1)
+    start = list(zip(walkers.loc_x.tolist(), walkers.loc_y.tolist()))
+    seconds, locations = best_time(lambda: htsu_interact.InteractingWalkers(
+        exp_layer, INTERACT_INDIVS, 1.0, no_steps_for_od, seed=1).run(INTERACT_STEPS), 1)
+    result = {'seconds': seconds, 'units': INTERACT_STEPS, 'unit': 'steps'}
+    if reference:
+        random_nos = numpy.random.default_rng(1).random((INTERACT_STEPS, INTERACT_INDIVS))
+        result['reference_seconds'], ref_locations = best_time(lambda: reference_interact(
+            exp_layer, start, 1.0, no_steps_for_od, random_nos), 1)
+        result['max_error'] = float(numpy.abs(locations - ref_locations).max())
+    return result
+
+
+def bench_kde(exp_layer, reference):
+    size = len(exp_layer)
+    rng = numpy.random.default_rng(1)
+    x_array = numpy.clip(rng.normal(size/2.0, size/8.0, KDE_POINTS), 0, size-1)
+    y_array = numpy.clip(rng.normal(size/2.0, size/8.0, KDE_POINTS), 0, size-1)
+    seconds, pd = best_time(lambda: htsu_kde.kde(x_array, y_array, size, size))
+    result = {'seconds': seconds, 'units': KDE_POINTS, 'unit': 'points'}
+    if reference:
+        result['reference_seconds'], ref_pd = best_time(lambda: htsu_kde.kde_exact(x_array, y_array, size, size), 1)
+        result['max_error'] = float(numpy.abs(pd - ref_pd).max()/ref_pd.max())
+    return result
+
+
+# Reference home range, as in the original htsu_fig2.py: cells are added one at a time,
+# each the largest UD value below the last one added, until pc% of the UD is covered
+def reference_home_range(ud, pc):
+    hr_contour = numpy.zeros(ud.shape)
+    max_found = math.inf
+    curr_pc = 0
+    while curr_pc < pc/100.0:
+        curr_max = ud[ud < max_found].max()
+        hr_contour[ud == curr_max] = 1
+        max_found = curr_max
+        curr_pc += curr_max*numpy.count_nonzero(ud == curr_max)
+    return hr_contour
+
+
+def bench_home_range(exp_layer, reference):
+    ud = htsu_bm.bm_ud(exp_layer, LAMBDA_VAL)
+    seconds, hr_contour = best_time(lambda: htsu_homerange.home_range_contour(ud, [95]))
+    result = {'seconds': seconds, 'units': ud.size, 'unit': 'cells'}
+    if reference:
+        result['reference_seconds'], ref_contour = best_time(lambda: reference_home_range(ud, 95), 1)
+        result['max_error'] = float(numpy.abs(hr_contour - ref_contour).max())
+    return result
+
+
+BENCHMARKS = [('step_sampler', bench_step_sampler), ('ensemble', bench_ensemble), ('bm_ud', bench_bm_ud),
+              ('me_step', bench_me_step), ('interact', bench_interact), ('kde', bench_kde),
+              ('home_range', bench_home_range)]
+
+
+# Run every benchmark on a layer of each size, writing progress to stderr, and return
+# the results with a description of the machine
+def run_benchmarks(sizes=SIZES, names=None):
+    results = []
+    for size in sizes:
+        exp_layer = numpy.exp(BETA_R*synthetic_layer(size))
+        for name, bench in BENCHMARKS:
+            if names is not None and name not in names:
+                continue
+            result = {'benchmark': name, 'size': size}
+            result.update(bench(exp_layer, size <= REFERENCE_MAX[name]))
+            result['rate'] = result['units']/result['seconds']
+            sys.stderr.write("%-13s %5i  %10.4g s  %10.4g %s/s%s\n" % (
+                name, size, result['seconds'], result['rate'], result['unit'],
+                "  (reference %.4g s, max error %.3g)" % (result['reference_seconds'], result['max_error'])
+                if 'max_error' in result else ''))
+            results += [result]
+    return {'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'machine': platform.platform(),
+            'results': results}
+
+
+# Benchmarks in new that take more than threshold times as long as in old
+def compare(old, new, threshold=1.2):
+    old_seconds = dict(((result['benchmark'], result['size']), result['seconds']) for result in old['results'])
+    slower = []
+    for result in new['results']:
+        key = (result['benchmark'], result['size'])
+        if key in old_seconds and result['seconds'] > threshold*old_seconds[key]:
+            slower += [(key[0], key[1], result['seconds']/old_seconds[key])]
+    return slower
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'compare':
+        old = json.load(open(sys.argv[2]))
+        new = json.load(open(sys.argv[3]))
+        threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 1.2
+        slower = compare(old, new, threshold)
+        for name, size, ratio in slower:
+            sys.stdout.write("%s at size %i is %.2f times slower\n" % (name, size, ratio))
+        sys.exit(1 if slower else 0)
+    sizes = [int(size) for size in sys.argv[2:]] or SIZES
+    outfile = open(sys.argv[1], 'w')
+    json.dump(run_benchmarks(sizes), outfile, indent=1)
+    outfile.close()
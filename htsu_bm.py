@@ -0,0 +1,112 @@
+###############################################################################
+# Name: htsu_bm.py
+#
+# Purpose: Barnett-Moorcroft utilisation distribution (UD), Equations (11) and (17),
+#
+#            U(x) = w(x) * integral over z of phi(|x-z|) w(z)  (normalised),
+#
+#          where phi(|x-z|) = exp(-lambda*|x-z|) and w(z) is the habitat weight,
+#          exp(beta_R*R(z)) for the resource-only model or
+#          exp(beta_R*R(z))*exp(-beta_C*|z-x_C|) with a central place.  Because phi
+#          is translation invariant the integral is a convolution, calculated here
+#          by zero-padded FFT in O(N log N) rather than as an O(N^2) sum.  The FFT
+#          result agrees with the direct sum (bm_ud_direct) to within about 1e-12
+#          of the largest UD value.
+#
+#          BMPredictor keeps the habitat weights exp(beta_R*R) and the transformed
+#          step-length kernel for the most recent values of beta_R and lambda, so
+#          that repeated predictions from one layer (e.g. after each refit of a step
+#          selection function) do not rebuild them.
+#
+# Usage: from htsu_bm import bm_ud
+#   ud = bm_ud(exp_layer, 0.2)
+#   ud = bm_ud(exp_layer*htsu_layer.central_place_layer(100, 100, 50, 50, 0.2), 0.2)
+#   predictor = BMPredictor(r_array)
+#   ud = predictor.ud(1.5, 0.2)
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import collections
+import numpy
+import htsu_kernel
+
+
+# Barnett-Moorcroft UD for the grid of habitat weights w, by FFT.  The optional
+# tolerance truncates phi where it discards at most that share of its mass (see
+# htsu_kernel.StepKernel), which shrinks the zero-padding on large landscapes.
+def bm_ud(weights, lambda_val, tolerance=None):
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+    box_height, box_width = weights.shape
+    kernel = htsu_kernel.StepKernel(lambda_val, box_width, box_height, tolerance=tolerance)
+    convolver = htsu_kernel.KernelConvolver(kernel, box_width, box_height)
+    ud = weights*numpy.maximum(convolver.convolve(weights), 0)
+    return ud/ud.sum()
+
+
+class BMPredictor:
+
+    # Set up predictions of the resource-only UD on the layer R (r_array).  tolerance is
+    # as for bm_ud, and up to max_cached sets of weights and of kernel transforms are kept.
+    def __init__(self, r_array, tolerance=None, max_cached=8):
+        self.r_array = numpy.asarray(r_array, dtype=numpy.float64)
+        self.box_height, self.box_width = self.r_array.shape
+        self.tolerance = tolerance
+        self.max_cached = max_cached
+        self.weight_cache = collections.OrderedDict()
+        self.convolver_cache = collections.OrderedDict()
+
+    # Look up key in cache, making the value with make() if it is missing and dropping
+    # the least recently used value if the cache is then too large
+    def cached(self, cache, key, make):
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = cache[key] = make()
+        if len(cache) > self.max_cached:
+            cache.popitem(last=False)
+        return value
+
+    # Habitat weights exp(beta_R*R(x))
+    def weights(self, beta_r):
+        return self.cached(self.weight_cache, beta_r, lambda: numpy.exp(beta_r*self.r_array))
+
+    # Convolver holding the transform of phi for lambda
+    def convolver(self, lambda_val):
+        return self.cached(self.convolver_cache, lambda_val, lambda: htsu_kernel.KernelConvolver(
+            htsu_kernel.StepKernel(lambda_val, self.box_width, self.box_height, tolerance=self.tolerance),
+            self.box_width, self.box_height))
+
+    # Barnett-Moorcroft UD for beta_R and lambda, as bm_ud(exp(beta_R*R), lambda)
+    def ud(self, beta_r, lambda_val):
+        weights = self.weights(beta_r)
+        ud = weights*numpy.maximum(self.convolver(lambda_val).convolve(weights), 0)
+        return ud/ud.sum()
+
+
+# Barnett-Moorcroft UD by summing directly over z for each x.  This costs O(N^2) and is
+# kept for checking bm_ud on small landscapes.
+def bm_ud_direct(weights, lambda_val):
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+    box_height, box_width = weights.shape
+    kernel = htsu_kernel.StepKernel(lambda_val, box_width, box_height)
+    ud = numpy.zeros((box_height, box_width))
+    for y_val in range(box_height):
+        for x_val in range(box_width):
+            kernel_window, (y0, y1, x0, x1) = kernel.window(x_val, y_val, box_width, box_height)
+            ud[y_val][x_val] = weights[y_val][x_val]*(kernel_window*weights[y0:y1, x0:x1]).sum()
+    return ud/ud.sum()
+
+
+# Limit of the UD as phi becomes arbitrarily narrow (Equation (12)): U proportional to w^2
+def narrow_ud(weights):
+    ud = numpy.asarray(weights, dtype=numpy.float64)**2
+    return ud/ud.sum()
+
+
+# Limit of the UD as phi samples from the whole landscape (Equation (13)): U proportional to w
+def wide_ud(weights):
+    ud = numpy.array(weights, dtype=numpy.float64)
+    return ud/ud.sum()
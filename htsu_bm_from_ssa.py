@@ -0,0 +1,69 @@
+###############################################################################
+# Name: htsu_bm_from_ssa.py
+#
+# Purpose: Takes some simulated movement data and a resource layer, uses
+#          step selection analysis to parametrise a movement kernel, then
+#          uses the Barnett-Moorcroft method to calculate a predicted
+#          utilisation distribution for the simulated animal, as htsu_bm_from_ssa.R
+#          does, but in one pass without R.  The step selection function is fitted by
+#          htsu_ssf.py and the UD calculated by FFT (htsu_bm.py), with the habitat
+#          weights and the transformed kernel built once and held by an
+#          htsu_bm.BMPredictor.
+#           --> see Suplementary Appendix F: "Calculating the steady state UD
+#          using the Barnett-Moorcroft method"
+#
+# Usage: To run this, use the following command
+#   python htsu_bm_from_ssa.py sim_ssf_rf1_beta1_1.csv random_field_100.inp ud.npy
+# or, also plotting the UD,
+#   python htsu_bm_from_ssa.py sim_ssf_rf1_beta1_1.csv random_field_100.inp ud.npy imgtemp.png
+#
+# The first parameter (sim_ssf_rf1_beta1_1.csv) gives the case and control locations
+# The second parameter is random_field_100.inp, which gives the resource layer
+# The third parameter (ud.npy) is the file storing the predicted UD, as an array
+# ud[y][x] in the layout of the layer (numpy .npy format)
+# The optional fourth parameter (imgtemp.png) is a file storing a plot of the UD
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys
+import numpy
+import htsu_layer, htsu_ssf, htsu_bm, htsu_render
+
+# File containing case and control locations
+curr_arg = 1
+ssffile = sys.argv[curr_arg]
+# File containing layer
+curr_arg += 1
+layerfile = sys.argv[curr_arg]
+# File for saving the UD
+curr_arg += 1
+udfile = sys.argv[curr_arg]
+# File for saving a plot of the UD (optional)
+curr_arg += 1
+savefile = sys.argv[curr_arg] if len(sys.argv) > curr_arg else None
+
+# Do the SSA.  lambda is the selection-free value from the observed step length and the
+# correction from SSA (see Forester et al. 2009 for rationale behind this correction), and
+# beta is the coefficient for the landscape layer.
+beta, lambda_val, fit = htsu_ssf.fit_step_selection(htsu_ssf.read_ssf_table(ssffile))
+sys.stderr.write("beta = %g (standard error %g), lambda = %g\n" % (beta, fit.std_errors[0], lambda_val))
+
+# Calculate the predicted UD using the Barnett-Moorcroft method
+predictor = htsu_bm.BMPredictor(htsu_layer.load_layer(layerfile))
+ud = predictor.ud(beta, lambda_val)
+numpy.save(udfile, ud)
+
+# Plot the UD as a raster
+if savefile is not None:
+    plt = htsu_render.pyplot()
+    fig = plt.figure()
+    fig.set_size_inches(7,6)
+    fig.add_subplot(1,1,1)
+    image = plt.imshow(ud, origin='lower', extent=[0,predictor.box_width,0,predictor.box_height])
+    plt.ylabel('Northing',fontsize=20)
+    plt.xlabel('Easting',fontsize=20)
+    plt.colorbar(image)
+    plt.savefig(savefile)
@@ -0,0 +1,191 @@
+###############################################################################
+# Name: htsu_cache.py
+#
+# Purpose: Disk cache of derived arrays (habitat weights, UDs, KDEs, home ranges) shared
+#          by the figure scripts, so that rerunning a script after changing only how it
+#          plots does not recompute them.  Each array is stored as a .npy file named by
+#          a hash of everything it was calculated from: the name of the quantity, the
+#          input arrays and files (by content), the parameters, and the source code of
+#          the modules that calculate it, together with every module of this package that
+#          they import (directly or through others), so that changing any of these gives
+#          a new entry rather than a stale one.  Entries are memory-mapped when read.
+#
+#          The cache is limited to max_bytes on disk.  Reading an entry marks it as
+#          recently used, and the least recently used entries are removed when the
+#          limit is exceeded.  ArrayCache.stats() gives the numbers of hits, misses and
+#          evictions.  The cache is off unless HTSU_CACHE_DIR names its directory (e.g.
+#          HTSU_CACHE_DIR=.htsu_cache); while it is off, get simply calculates the array
+#          and nothing is counted.
+#
+# Usage: HTSU_CACHE_DIR=.htsu_cache python htsu_fig2.py random_field_100.inp 1.5 0.2 0.2 1000 -4 4 1 fig2.png
+# or, from Python,
+#   from htsu_cache import ArrayCache
+#   cache = ArrayCache()
+#   ud = cache.get('bm_ud', lambda: htsu_bm.bm_ud(weights, 0.2), weights, 0.2, htsu_bm, htsu_kernel)
+#   sys.stderr.write(cache.report() + '\n')
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import os, glob, types, hashlib
+import numpy
+
+# Default limit on the total size of the cache on disk
+MAX_BYTES = 2**30
+
+# Size of the blocks in which files are read for hashing
+HASH_BLOCK = 2**20
+
+
+# Hash of the content of a file, to be used as a key part for data read from it
+def file_digest(filename):
+    hasher = hashlib.blake2b(digest_size=20)
+    infile = open(filename, 'rb')
+    for block in iter(lambda: infile.read(HASH_BLOCK), b''):
+        hasher.update(block)
+    infile.close()
+    return hasher.hexdigest()
+
+
+# The module and the modules of the same directory (this package) that it imports, directly
+# or through others, sorted by name
+def module_closure(module, found=None):
+    if found is None:
+        found = {}
+    found[module.__name__] = module
+    directory = os.path.dirname(os.path.abspath(module.__file__))
+    for value in vars(module).values():
+        if (isinstance(value, types.ModuleType) and value.__name__ not in found and
+                getattr(value, '__file__', None) and
+                os.path.dirname(os.path.abspath(value.__file__)) == directory):
+            module_closure(value, found)
+    return [found[name] for name in sorted(found)]
+
+
+# Add one part of a key to hasher: arrays by type, shape and content, modules by the
+# content of their source files and those of the modules of this package that they
+# import, sequences part by part, and anything else by repr
+def hash_part(hasher, part):
+    if isinstance(part, numpy.ndarray):
+        part = numpy.ascontiguousarray(part)
+        hasher.update(('array %s %s;' % (part.dtype.str, part.shape)).encode('utf-8'))
+        hasher.update(part.view(numpy.uint8).reshape(-1).data)
+    elif isinstance(part, types.ModuleType):
+        for module in module_closure(part):
+            hasher.update(('module %s %s;' % (module.__name__, file_digest(module.__file__))).encode('utf-8'))
+    elif isinstance(part, (list, tuple)):
+        hasher.update(('sequence %i;' % len(part)).encode('utf-8'))
+        for item in part:
+            hash_part(hasher, item)
+    else:
+        hasher.update(('%s %r;' % (type(part).__name__, part)).encode('utf-8'))
+
+
+class ArrayCache:
+
+    # Open (creating if need be) the cache in directory, limited to max_bytes on disk.
+    # directory=None takes it from HTSU_CACHE_DIR, and an empty directory (the default
+    # when that is not set) turns the cache off, so that get always computes.
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        if directory is None:
+            directory = os.environ.get('HTSU_CACHE_DIR', '')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError:
+                # Unusable directory (e.g. read-only): carry on without the cache
+                self.directory = ''
+
+    # Key of the entry for name calculated from parts
+    def key(self, name, *parts):
+        hasher = hashlib.blake2b(digest_size=20)
+        hash_part(hasher, (name,) + parts)
+        return hasher.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    # Read the entry with key (memory-mapped), or return None if there is none
+    def load(self, key):
+        if not self.directory:
+            return None
+        filename = self.filename(key)
+        try:
+            array = numpy.load(filename, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+        return array
+
+    # Store array as the entry with key.  As in htsu_layer.write_cache, it is written to a
+    # temporary file first, and failing to write it is not an error.
+    def save(self, key, array):
+        if not self.directory:
+            return
+        filename = self.filename(key)
+        tmpfile = filename + '.%i.tmp' % os.getpid()
+        try:
+            with open(tmpfile, 'wb') as outfile:
+                numpy.save(outfile, numpy.asarray(array))
+            os.replace(tmpfile, filename)
+        except OSError:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            return
+        self.evict()
+
+    # Remove the least recently used entries until the cache is within max_bytes
+    def evict(self):
+        entries = []
+        for filename in glob.glob(os.path.join(self.directory, '*.npy')):
+            try:
+                status = os.stat(filename)
+            except OSError:
+                continue
+            entries += [(status.st_mtime, status.st_size, filename)]
+        total = sum(size for mtime, size, filename in entries)
+        for mtime, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    # The array called name calculated from parts: read from the cache if it is there,
+    # otherwise calculated by compute() and stored
+    def get(self, name, compute, *parts):
+        if not self.directory:
+            return numpy.asarray(compute())
+        key = self.key(name, *parts)
+        array = self.load(key)
+        if array is not None:
+            self.hits += 1
+            return array
+        self.misses += 1
+        array = numpy.asarray(compute())
+        self.save(key, array)
+        return array
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    # One-line summary of the statistics
+    def report(self):
+        if not self.directory:
+            return "Cache off (set HTSU_CACHE_DIR to turn it on)"
+        return "Cache %s: %i hits, %i misses, %i evictions" % (self.directory, self.hits, self.misses,
+                                                                self.evictions)
@@ -0,0 +1,214 @@
+###############################################################################
+# Name: htsu_controls.py
+#
+# Purpose: Build case/control data for step selection analysis from a trajectory, in
+#          the layout of sim_ssf_rf1_beta1_1.csv
+#
+#            Observed,strata,x-val,y-val,resource,StepLength
+#
+#          Each step of the trajectory is one stratum: the observed step (Observed=1)
+#          followed by no_controls control steps (Observed=0) from the same start.  A
+#          control step has a step length and a turning angle (relative to the bearing
+#          of the last step on which the animal moved) drawn either from those observed
+#          ('empirical') or from an exponential and a von Mises distribution fitted to
+#          them; before the animal first moves, control bearings are uniform.  Control
+#          end points are rounded to the lattice, and those that fall off the layer are
+#          drawn again.  resource is the layer at the end point and StepLength the
+#          distance from the start to the end point.
+#
+#          Everything is done on arrays of whole blocks of steps (one numpy operation
+#          per column, not per row), and the table is produced a block of about
+#          CHUNK_ROWS rows at a time, so long tracks with many controls are written
+#          without ever being held in memory at once.
+#
+# Usage: To run this, use the following command
+#   python htsu_controls.py temp.out random_field_100.inp 10 temp.csv
+# or, with control steps drawn from fitted distributions and a fixed seed,
+#   python htsu_controls.py temp.out random_field_100.inp 10 temp.csv exponential vonmises 1
+#
+# The first parameter (temp.out) is a trajectory file (text or binary, see htsu_traj.py); every
+# individual in it is used, with strata numbered on from one individual to the next
+# The second parameter (random_field_100.inp) is the resource layer
+# The third parameter (10) is the number of control steps for each observed step
+# The fourth parameter (temp.csv) is the output file
+# The optional fifth parameter is the step-length distribution, empirical (default) or exponential
+# The optional sixth parameter is the turning-angle distribution, empirical (default), vonmises or uniform
+# The optional seventh parameter is the seed of the random number generator
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys, math, itertools
+import numpy
+import htsu_layer, htsu_traj
+
+# Columns of the case/control table, as in sim_ssf_rf1_beta1_1.csv
+COLUMNS = ['Observed', 'strata', 'x-val', 'y-val', 'resource', 'StepLength']
+
+# Format of one row of the table
+ROW_FORMAT = '%i,%i,%i,%i,%.7f,%.7f\n'
+
+# Approximate number of rows produced at a time
+CHUNK_ROWS = 2**20
+
+# Number of times control steps that fall off the layer are drawn again, before the
+# remaining ones are moved onto its nearest edge
+MAX_REDRAWS = 1000
+
+
+# Wrap angles onto [-pi, pi)
+def wrap_angle(angle):
+    return (angle + numpy.pi) % (2*numpy.pi) - numpy.pi
+
+
+# Concentration of a von Mises distribution with mean resultant length r_val (the
+# approximation of Best and Fisher, 1981)
+def vonmises_kappa(r_val):
+    if r_val < 0.53:
+        return 2*r_val + r_val**3 + 5*r_val**5/6
+    if r_val < 0.85:
+        return -0.4 + 1.39*r_val + 0.43/(1-r_val)
+    if r_val < 1:
+        return 1/(r_val**3 - 4*r_val**2 + 3*r_val)
+    return math.inf
+
+
+# Lengths and bearings of the observed steps, from positions i-1 to i, and the bearing of
+# the last step before each one on which the animal moved (nan if it has not yet moved)
+def observed_steps(loc_x, loc_y):
+    dx = numpy.diff(numpy.asarray(loc_x, dtype=numpy.float64))
+    dy = numpy.diff(numpy.asarray(loc_y, dtype=numpy.float64))
+    lengths = numpy.hypot(dx, dy)
+    bearings = numpy.arctan2(dy, dx)
+    moved = lengths > 0
+    # Index of the last step so far on which the animal moved (-1 if none)
+    last_moved = numpy.maximum.accumulate(numpy.where(moved, numpy.arange(len(moved)), -1))
+    last_moved = numpy.r_[-1, last_moved[:-1]]
+    previous_bearings = numpy.where(last_moved >= 0, bearings[numpy.maximum(last_moved, 0)], numpy.nan)
+    return lengths, bearings, previous_bearings
+
+
+# Set up a function drawing size step lengths, given the observed step lengths
+def step_length_sampler(lengths, step_dist, rng):
+    if step_dist == 'empirical':
+        return lambda size: rng.choice(lengths, size=size)
+    if step_dist == 'exponential':
+        mean_length = numpy.mean(lengths)
+        return lambda size: rng.exponential(mean_length, size=size)
+    raise ValueError("Unknown step-length distribution %s" % step_dist)
+
+
+# Set up a function drawing size turning angles, given the observed turning angles
+def turn_angle_sampler(turns, turn_dist, rng):
+    if turn_dist == 'uniform' or len(turns) == 0:
+        return lambda size: rng.uniform(-numpy.pi, numpy.pi, size=size)
+    if turn_dist == 'empirical':
+        return lambda size: rng.choice(turns, size=size)
+    if turn_dist == 'vonmises':
+        mean_cos = numpy.mean(numpy.cos(turns))
+        mean_sin = numpy.mean(numpy.sin(turns))
+        mu = math.atan2(mean_sin, mean_cos)
+        kappa = vonmises_kappa(math.hypot(mean_cos, mean_sin))
+        if math.isinf(kappa):
+            return lambda size: numpy.full(size, mu)
+        return lambda size: rng.vonmises(mu, kappa, size=size)
+    raise ValueError("Unknown turning-angle distribution %s" % turn_dist)
+
+
+# Stream the case/control table for the trajectory (loc_x, loc_y) on layer, as 2D arrays
+# with the columns COLUMNS.  Strata are numbered from first_stratum.
+def iter_case_control(loc_x, loc_y, layer, no_controls, step_dist='empirical', turn_dist='empirical',
+                      first_stratum=1, seed=None, chunk_rows=CHUNK_ROWS):
+    rng = seed if isinstance(seed, numpy.random.Generator) else numpy.random.default_rng(seed)
+    layer = numpy.asarray(layer)
+    box_height, box_width = layer.shape
+    loc_x = numpy.asarray(loc_x, dtype=numpy.int64)
+    loc_y = numpy.asarray(loc_y, dtype=numpy.int64)
+    lengths, bearings, previous_bearings = observed_steps(loc_x, loc_y)
+    turned = (lengths > 0) & ~numpy.isnan(previous_bearings)
+    draw_lengths = step_length_sampler(lengths, step_dist, rng)
+    draw_turns = turn_angle_sampler(wrap_angle(bearings[turned] - previous_bearings[turned]), turn_dist, rng)
+
+    chunk_steps = max(1, chunk_rows//(no_controls+1))
+    for first in range(0, len(lengths), chunk_steps):
+        last = min(first + chunk_steps, len(lengths))
+        steps = last - first
+        start_x = numpy.repeat(loc_x[first:last], no_controls)
+        start_y = numpy.repeat(loc_y[first:last], no_controls)
+        heading = numpy.repeat(previous_bearings[first:last], no_controls)
+        # Draw the control steps, drawing again those that end off the layer
+        end_x = numpy.zeros(steps*no_controls, dtype=numpy.int64)
+        end_y = numpy.zeros(steps*no_controls, dtype=numpy.int64)
+        todo = numpy.arange(steps*no_controls)
+        for redraw in range(MAX_REDRAWS):
+            step_lengths = draw_lengths(len(todo))
+            angles = draw_turns(len(todo)) + heading[todo]
+            no_heading = numpy.isnan(angles)
+            angles[no_heading] = rng.uniform(-numpy.pi, numpy.pi, size=numpy.count_nonzero(no_heading))
+            end_x[todo] = start_x[todo] + numpy.rint(step_lengths*numpy.cos(angles)).astype(numpy.int64)
+            end_y[todo] = start_y[todo] + numpy.rint(step_lengths*numpy.sin(angles)).astype(numpy.int64)
+            todo = todo[(end_x[todo] < 0) | (end_x[todo] >= box_width) |
+                        (end_y[todo] < 0) | (end_y[todo] >= box_height)]
+            if len(todo) == 0:
+                break
+        numpy.clip(end_x, 0, box_width-1, out=end_x)
+        numpy.clip(end_y, 0, box_height-1, out=end_y)
+
+        # One stratum per row: the observed step, then its controls
+        table = numpy.zeros((steps, no_controls+1, len(COLUMNS)))
+        table[:,0,0] = 1
+        table[:,:,1] = (first_stratum + numpy.arange(first, last))[:,numpy.newaxis]
+        table[:,0,2] = loc_x[first+1:last+1]
+        table[:,0,3] = loc_y[first+1:last+1]
+        table[:,1:,2] = end_x.reshape((steps, no_controls))
+        table[:,1:,3] = end_y.reshape((steps, no_controls))
+        table[:,0,5] = lengths[first:last]
+        table[:,1:,5] = numpy.hypot(end_x - start_x, end_y - start_y).reshape((steps, no_controls))
+        table = table.reshape((-1, len(COLUMNS)))
+        table[:,4] = layer[table[:,3].astype(numpy.int64), table[:,2].astype(numpy.int64)]
+        yield table
+
+
+# Write the header and then each chunk of a case/control table to the open text file
+# outfile, formatting a whole chunk in one operation
+def write_table(outfile, chunks):
+    outfile.write(','.join(COLUMNS) + '\n')
+    for chunk in chunks:
+        outfile.write((ROW_FORMAT*len(chunk)) % tuple(chunk.ravel()))
+
+
+if __name__ == '__main__':
+    # Trajectory file
+    curr_arg = 1
+    trajfile = sys.argv[curr_arg]
+    # File containing layer
+    curr_arg += 1
+    layerfile = sys.argv[curr_arg]
+    # Number of control steps for each observed step
+    curr_arg += 1
+    no_controls = int(sys.argv[curr_arg])
+    # Output file
+    curr_arg += 1
+    outfilename = sys.argv[curr_arg]
+    # Step-length and turning-angle distributions (optional)
+    curr_arg += 1
+    step_dist = sys.argv[curr_arg] if len(sys.argv) > curr_arg else 'empirical'
+    curr_arg += 1
+    turn_dist = sys.argv[curr_arg] if len(sys.argv) > curr_arg else 'empirical'
+    # Seed (optional)
+    curr_arg += 1
+    seed = int(sys.argv[curr_arg]) if len(sys.argv) > curr_arg else None
+
+    layer = htsu_layer.load_layer(layerfile)
+    rng = numpy.random.default_rng(seed)
+    positions = htsu_traj.read_file_positions(trajfile)
+    # Strata are numbered on from one individual to the next
+    first_strata = numpy.cumsum([1] + [len(x_array) - 1 for x_array, y_array in positions])
+    outfile = open(outfilename, 'w')
+    write_table(outfile, itertools.chain.from_iterable(
+        iter_case_control(x_array, y_array, layer, no_controls, step_dist, turn_dist,
+                          first_stratum=first_stratum, seed=rng)
+        for (x_array, y_array), first_stratum in zip(positions, first_strata)))
+    outfile.close()
@@ -0,0 +1,116 @@
+###############################################################################
+# Name: htsu_ensemble.py
+#
+# Purpose: Simulate many independent step selection walkers in lockstep.  At each
+#          step all the walkers' next positions are drawn in one batched operation,
+#          rather than running one walker per process.  The kernel windows are never
+#          gathered whole: the total weight of each row of every walker's window is
+#          summed one kernel row at a time, the row is drawn from those totals, and then
+#          only the chosen row is gathered to draw the column.  The movement kernel is
+#
+#            exp(-lambda*|x-z|) * w(z) * exp(kappa*cos(alpha_x-alpha_z)),
+#
+#          where w(z) is the habitat weight (e.g. compiled from the covariates and the
+#          central place by htsu_weights.py), alpha_x is the bearing of the previous
+#          step and alpha_z the bearing of the step to z.
+#
+# Usage: from htsu_ensemble import simulate_ensemble
+#   weights = htsu_weights.compile_weights([r_array], [1.5], centre=(50, 50), beta_c=0.2).weights
+#   paths = simulate_ensemble(weights, 0.2, 10000, 1000, kappa=2)
+#   # paths[walker][step] is the (x,y) position of each walker at each step
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
+import htsu_kernel, htsu_sample
+
+# Largest number of habitat weights gathered at once (walkers times the width of the
+# kernel), which bounds the memory used when the ensemble is moved through in chunks
+MAX_GATHER = 2**22
+
+
+# Simulate no_walkers independent walkers for step_no steps (including the start) on
+# the grid of habitat weights w.  All walkers start at start=(x,y), by default the
+# middle of the landscape, with bearing start_bearing.  The von Mises term is included
+# if kappa is non-zero.  If tolerance is given, the step-length kernel is truncated
+# where it discards at most tolerance of its mass (see htsu_kernel); by default it
+# covers the whole landscape, as in htsu_walk.simulate_path.  If
+# bearing_bins is given, the von Mises term is looked up from an
+# htsu_kernel.BearingKernelCache with that many bearings, rather than calculated exactly.
+# Returns an int32 array of shape (no_walkers, step_no, 2) holding the x- and
+# y-positions.
+def simulate_ensemble(weights, lambda_val, no_walkers, step_no, start=None, kappa=0, start_bearing=0,
+                      tolerance=None, bearing_bins=None, seed=None):
+    rng = numpy.random.default_rng(seed)
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+    box_height, box_width = weights.shape
+    if start is None:
+        start = (box_width//2, box_height//2)
+
+    # Habitat weights, padded with zeros so that every kernel window lies inside the array
+    kernel = htsu_kernel.StepKernel(lambda_val, box_width, box_height, tolerance=tolerance)
+    padded = numpy.pad(weights, ((kernel.radius_y, kernel.radius_y), (kernel.radius_x, kernel.radius_x)))
+    # row_windows[y][x] is the kernel-wide row of habitat weights starting at (x,y) in
+    # the padded array, with no copying.  Row r of the kernel window around (x,y) is
+    # row_windows[y+r][x].
+    kernel_height, kernel_width = kernel.table.shape
+    row_windows = sliding_window_view(padded, kernel_width, axis=1)
+
+    # Offsets of the kernel window, and the bearing of each (zero for staying put, as
+    # atan2(0,0) = 0)
+    offset_y, offset_x = numpy.mgrid[-kernel.radius_y:kernel.radius_y+1, -kernel.radius_x:kernel.radius_x+1]
+    offset_bearing = htsu_kernel.offset_bearing_table(kernel.radius_x, kernel.radius_y)
+    if kappa != 0 and bearing_bins is not None:
+        cache = htsu_kernel.BearingKernelCache(kernel, kappa, n_bins=bearing_bins)
+        bearing_tables = cache.all_tables()
+
+    paths = numpy.zeros((no_walkers, step_no, 2), dtype=numpy.int32)
+    paths[:,0,0] = start[0]
+    paths[:,0,1] = start[1]
+    bearing = numpy.full(no_walkers, float(start_bearing))
+    chunk_size = max(1, MAX_GATHER//kernel_width)
+
+    # Kernel weights (step length and, if kappa is non-zero, direction) of the given rows
+    # of the window, for walkers with the given bearings, one row of shape
+    # (walkers, kernel_width) per walker.  rows is a single row or one row per walker.
+    def kernel_rows(rows, walker_bearings):
+        if kappa != 0 and bearing_bins is not None:
+            bins = numpy.round(walker_bearings*bearing_bins/(2*numpy.pi)).astype(int) % bearing_bins
+            return bearing_tables[bins, rows]
+        table_rows = kernel.table[rows]
+        if kappa != 0:
+            table_rows = table_rows*numpy.exp(kappa*numpy.cos(walker_bearings[:,numpy.newaxis] -
+                                                              offset_bearing[rows]))
+        return table_rows
+
+    for step in range(1, step_no):
+        loc_x = paths[:,step-1,0]
+        loc_y = paths[:,step-1,1]
+        random_nos = rng.random(no_walkers)
+        for first in range(0, no_walkers, chunk_size):
+            walkers = slice(first, min(first + chunk_size, no_walkers))
+            chunk_x = loc_x[walkers]
+            chunk_y = loc_y[walkers]
+            # Total weight of each row of each walker's kernel window
+            row_totals = numpy.empty((len(chunk_x), kernel_height))
+            for row in range(kernel_height):
+                table_rows = kernel_rows(row, bearing[walkers])
+                if table_rows.ndim == 1:
+                    row_totals[:,row] = row_windows[chunk_y + row, chunk_x] @ table_rows
+                else:
+                    row_totals[:,row] = numpy.einsum('ij,ij->i', row_windows[chunk_y + row, chunk_x], table_rows)
+            # Draw the rows, then the columns within them, reusing what is left of each
+            # random number
+            rows, fractions = htsu_sample.draw_indices(row_totals, random_nos[walkers], leftover=True)
+            row_weights = row_windows[chunk_y + rows, chunk_x]*kernel_rows(rows, bearing[walkers])
+            cols = htsu_sample.draw_indices(row_weights, fractions)
+            paths[walkers,step,0] = loc_x[walkers] + offset_x[rows,cols]
+            paths[walkers,step,1] = loc_y[walkers] + offset_y[rows,cols]
+            # The bearing only changes if the walker has moved
+            moved = (offset_x[rows,cols] != 0) | (offset_y[rows,cols] != 0)
+            bearing[walkers] = numpy.where(moved, offset_bearing[rows,cols], bearing[walkers])
+    return paths
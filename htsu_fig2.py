@@ -5,18 +5,24 @@
 #          patterns: an approach via step selection" by JR Potts and L Borger
 #
 # Usage: python htsu_fig2.py random_field_100.inp 1.5 0.2 0.2 1000 -4 4 1 fig2.png 
+#   Giving none as the plot file (fig2.png) only calculates, without importing matplotlib.
+#   An optional last parameter (e.g. 1e-6) truncates the step-length kernel where it discards
+#   at most that much of its mass; the default (or none) is to evaluate it over the whole
+#   landscape.  A parameter after that gives a .npy file for saving a KDE of the simulated
+#   positions (or none), e.g.
+#   python htsu_fig2.py random_field_100.inp 1.5 0.2 0.2 1000 -4 4 1 fig2.png none kde.npy
 #
 # Author: Jonathan R. Potts
 #
 # Feel free to share and adapt, but giving appropriate credit
 ###############################################################################
 
-import sys, math, random
-from matplotlib import pyplot as plt
+import sys, random, numpy
+import htsu_layer, htsu_weights, htsu_kernel, htsu_walk, htsu_bm, htsu_kde, htsu_homerange, htsu_cache, htsu_profile, htsu_render
 
 # File containing layer
 curr_arg = 1
-infile = open(sys.argv[curr_arg],'r')
+layerfile = sys.argv[curr_arg]
 # beta_r-value (strength of resource effect)
 curr_arg += 1
 beta_r = float(sys.argv[curr_arg])
@@ -39,6 +45,12 @@ contourres = int(sys.argv[curr_arg])
 # Get file for saving plot
 curr_arg += 1
 savefile = sys.argv[curr_arg]
+# Tolerance on the mass of the step-length kernel discarded by truncating it (optional)
+curr_arg += 1
+tolerance = float(sys.argv[curr_arg]) if len(sys.argv) > curr_arg and sys.argv[curr_arg] != 'none' else None
+# File for saving the KDE of the simulated positions (optional)
+curr_arg += 1
+kdefile = sys.argv[curr_arg] if len(sys.argv) > curr_arg and sys.argv[curr_arg] != 'none' else None
 
 ############################
 # Simulate the path
@@ -47,70 +59,51 @@ savefile = sys.argv[curr_arg]
 # Start the random number generator
 random.seed()
 
-# Get the Z-values and also exp(beta*Z(x)) and exp(2*beta*Z(x))
-z_array = [[]]
-exp_layer = [[]]
-exp_2layer = [[]]
-infile.seek(0)
-y_val = -1
-for line in infile:
-    y_val += 1
-    if y_val != 0:
-        z_array += [[]]
-        exp_layer += [[]]
-        exp_2layer += [[]]
-    split_line = line.rsplit()
-    for x_val in range(len(split_line)):
-        z_array[y_val] += [float(split_line[x_val])]
-        exp_layer[y_val] += [math.exp(beta_r*z_array[y_val][x_val])]
-        exp_2layer[y_val] += [math.exp(beta_r*2*z_array[y_val][x_val])]
-infile.close()
+# Derived grids (habitat weights, UDs and home ranges) are kept on disk between runs, if
+# HTSU_CACHE_DIR is set (see htsu_cache.py)
+cache = htsu_cache.ArrayCache()
+
+# Get the Z-values
+with htsu_profile.stage('load_layer'):
+    z_array = htsu_layer.load_layer(layerfile)
 
 # Box size
 box_width = len(z_array[0])
 box_height = len(z_array)
 
 # Central point
-xc = box_width/2
-yc = box_height/2
-
-# Start location
-loc_x = [xc]
-loc_y = [yc]
+xc = box_width//2
+yc = box_height//2
+
+# Tabulate the step-length term of the movement kernel, exp(-lambda*|x-z|), for every offset
+with htsu_profile.stage('kernel'):
+    kernel = htsu_kernel.StepKernel(lambda_val, box_width, box_height, tolerance=tolerance)
+if tolerance is not None:
+    sys.stderr.write("Step-length kernel truncated at radius %i: discarded tail mass %g\n" %
+                     (kernel.radius, kernel.tail_mass))
+
+# The resource and central-place terms do not change from step to step, so compile them once
+# into the habitat weights exp(beta_r*Z(x)-beta_c*|x-x_C|)
+with htsu_profile.stage('habitat_layer'):
+    habitat_layer = cache.get('habitat_layer',
+                              lambda: htsu_weights.compile_weights([z_array], [beta_r], (xc, yc), beta_c).weights,
+                              z_array, beta_r, beta_c, xc, yc, htsu_weights)
+
+# KDE of the positions, built up as they are simulated
+accumulator = htsu_kde.KDEAccumulator(box_width, box_height)
+accumulator.add(xc, yc)
 
 # Find locations
-for step in range(1,step_no):
-    # Draw a random number
-    random_no = random.random()
-    # Calculate the cumulative distribution
-    cum_dist = [[]]
-    cum_val = 0
-    for y_val in range(len(exp_layer)):
-        if y_val != 0:
-            cum_dist += [[]]
-        for x_val in range(len(exp_layer[y_val])):
-            cum_val += (math.exp(-lambda_val*math.sqrt((float(x_val-loc_x[step-1]))**2+(float(y_val-loc_y[step-1]))**2))*
-                        exp_layer[y_val][x_val]*
-                        math.exp(-beta_c*math.sqrt((float(x_val-xc))**2+(float(y_val-yc))**2)))
-            cum_dist[y_val] += [cum_val]
-    # Normalise probabilities 
-    for y_val in range(len(cum_dist)):
-        for x_val in range(len(cum_dist[y_val])):
-            cum_dist[y_val][x_val] /= cum_val
-    
-    # Flag that we have not yet found the position
-    found = 0
-    # Find the x- and y-values corresponding to this random draw
-    for y_val in range(len(cum_dist)):
-        for x_val in range(len(cum_dist[y_val])):
-            if cum_dist[y_val][x_val] > random_no:
-                loc_x += [x_val]
-                loc_y += [y_val]
-                # Flag that we have found the position
-                found = 1
-                break
-        if found == 1:
-            break
+htsu_profile.begin('sampling', units=step_no-1)
+progress = htsu_profile.Progress(step_no-1)
+def visit(x, y):
+    accumulator.add(x, y)
+    progress.update()
+loc_x, loc_y = htsu_walk.simulate_path(habitat_layer, kernel, step_no, (xc, yc), visit=visit)
+htsu_profile.end()
+
+if kdefile is not None:
+    numpy.save(kdefile, accumulator.density())
 
 # Add random jitter to account for the fact that locations may be at any point within a pixel
 for point in range(len(loc_x)):
@@ -122,173 +115,83 @@ for point in range(len(loc_x)):
 ###############################
 
 # Estimations from Equation (18) and (19) 
-ud1 = [[]]
-ud2 = [[]]
-ud1_tot = 0
-ud2_tot = 0
-for y_val in range(len(exp_layer)):
-    if y_val != 0:
-        ud1 += [[]]
-        ud2 += [[]]
-    for x_val in range(len(exp_layer[0])):
-        ud1[y_val] += [exp_layer[y_val][x_val]*math.exp(-beta_c*math.sqrt((float(x_val-xc))**2+(float(y_val-yc))**2))]
-        ud2[y_val] += [exp_2layer[y_val][x_val]*math.exp(-2*beta_c*math.sqrt((float(x_val-xc))**2+(float(y_val-yc))**2))]
-        ud1_tot += ud1[y_val][x_val] 
-        ud2_tot += ud2[y_val][x_val]
-for y_val in range(len(exp_layer)):
-    for x_val in range(len(exp_layer[0])):
-        ud1[y_val][x_val] /= ud1_tot
-        ud2[y_val][x_val] /= ud2_tot
+htsu_profile.begin('ud_integration')
+ud1 = htsu_bm.wide_ud(habitat_layer)
+ud2 = htsu_bm.narrow_ud(habitat_layer)
+
+# Estimations from Equation (17) requires a numerical integration of phi(|x-z|)*exp(beta.Z(z)) over
+# z, which is a convolution of phi with the habitat weights, calculated by FFT
+ud = cache.get('bm_ud', lambda: htsu_bm.bm_ud(habitat_layer, lambda_val),
+               habitat_layer, lambda_val, htsu_bm, htsu_kernel)
+htsu_profile.end()
 
-# Estimations from Equation (17) requires a numerical integration (i.e. a sum)
-ud = [[]]
-ud_tot = 0 # Sum of the UD values
-for y_val in range(len(exp_layer)):
-    if y_val != 0:
-      ud += [[]]
-    for x_val in range(len(exp_layer[0])):
-        ud[y_val] += [0]
-        # Calculate the integral of phi(|x-z|)*exp(beta.Z(z)) over all z.  Here x=(y_val,x_val), z=(int_x,int_y)
-        for int_y in range(len(exp_layer)):
-            for int_x in range(len(exp_layer[0])):
-                ud[y_val][x_val] += (math.exp(-lambda_val*math.sqrt((float(x_val-int_x))**2+(float(y_val-int_y))**2))*
-                                     exp_layer[int_y][int_x]*
-                                     math.exp(-beta_c*math.sqrt((float(int_x-xc))**2+(float(int_y-yc))**2)))
-        # Multiply by exp(beta.Z(x))
-        ud[y_val][x_val]*=exp_layer[y_val][x_val]*math.exp(-beta_c*math.sqrt((float(x_val-xc))**2+(float(y_val-yc))**2))
-        # Increment sum of UD values
-        ud_tot += ud[y_val][x_val]
-# Normalise
-for y_val in range(len(exp_layer)):
-    for x_val in range(len(exp_layer[0])):
-        ud[y_val][x_val] /= ud_tot
+# Home ranges (1 in the pc% home range) of the three UDs
+pc = 95.0 # kernel percentage 
+with htsu_profile.stage('home_range'):
+    hr_contours = [cache.get('home_range_contour', lambda: htsu_homerange.home_range_contour(est_ud, [pc]),
+                             est_ud, pc, htsu_homerange) for est_ud in [ud, ud1, ud2]]
+sys.stderr.write(cache.report() + '\n')
 
 ###############################
 # Plot locations and contours
 ###############################
         
-# Plot resource layer and locations
-fig = plt.figure()
-fig.set_size_inches(12,12)
-fig.add_subplot(2,2,1)
-plt.hold('on')
-filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
-plt.ylabel('Northing',fontsize=20)
-# Make a colorbar 
-#cbar = plt.colorbar(filled_contours)
-
-# Plot locations as black dots
-plt.scatter(loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
-plt.text(2,90,'a)',fontsize=26)
-
-# Plot estimated UD and locations: Equation (17)
-fig.add_subplot(2,2,2)
-plt.hold('on')
-# Plot resource layer
-filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
-# Plot UD contours
-pc = 95.0 # kernel percentage 
-max_found = 2
-curr_pc = 0
-# Set up array for storing contour locations.  This is an array of zeros initially.  Later,
-# the places within the pc% kernel of the UD will be populated with ones
-hr_contour = [[]]
-for y_val in range(len(ud)):
-    if y_val != 0:
-        hr_contour += [[]]
-    for x_val in range(len(ud[0])):
-        hr_contour[y_val] += [0]
-# Populate the places within the pc% kernel of the UD with ones
-while curr_pc < pc/100.0:
-    curr_max = 0
-    max_x = 0
-    max_y = 0
-    # Find the highest value in the array that is less than max_found.  This then becomes a 
-    for y_val in range(len(ud)):
-        for x_val in range(len(ud[0])):
-            if (ud[y_val][x_val] > curr_max) and (ud[y_val][x_val] < max_found):
-                curr_max = ud[y_val][x_val]
-                max_x = x_val
-                max_y = y_val
-    # Set the output array at position where this max is found to 1
-    hr_contour[max_y][max_x] = 1
-    max_found = curr_max
-    curr_pc += max_found
-plt.contour(hr_contour, origin='lower',colors='b', extent=[0,len(ud[0]),0,len(ud)],levels=[0,1],linestyles='solid')
-plt.scatter(loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
-plt.text(2,90,'b)',fontsize=26)
-
-# Plot estimated UD and locations: Equation (18)
-fig.add_subplot(2,2,3)
-plt.hold('on')
-# Plot resource layer
-filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
-# Plot UD contours
-pc = 95.0 # kernel percentage 
-max_found = 2
-curr_pc = 0
-# Set up array for storing contour locations.  This is an array of zeros initially.  Later,
-# the places within the pc% kernel of the UD will be populated with ones
-for y_val in range(len(hr_contour)):
-    for x_val in range(len(hr_contour[0])):
-        hr_contour[y_val][x_val] = 0
-# Populate the places within the pc% kernel of the UD with ones
-while curr_pc < pc/100.0:
-    curr_max = 0
-    max_x = 0
-    max_y = 0
-    # Find the highest value in the array that is less than max_found.  This then becomes a 
-    for y_val in range(len(ud1)):
-        for x_val in range(len(ud1[0])):
-            if (ud1[y_val][x_val] > curr_max) and (ud1[y_val][x_val] < max_found):
-                curr_max = ud1[y_val][x_val]
-                max_x = x_val
-                max_y = y_val
-    # Set the output array at position where this max is found to 1
-    hr_contour[max_y][max_x] = 1
-    max_found = curr_max
-    curr_pc += max_found
-plt.contour(hr_contour, origin='lower',colors='b', extent=[0,len(ud1[0]),0,len(ud1)],levels=[0,1],linestyles='solid')
-plt.scatter(loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
-plt.xlabel('Easting',fontsize=20)
-plt.ylabel('Northing',fontsize=20)
-plt.text(2,90,'c)',fontsize=26)
-
-# Plot estimated UD and locations: Equation (19)
-fig.add_subplot(2,2,4)
-plt.hold('on')
-# Plot resource layer
-filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
-# Plot UD contours
-pc = 95.0 # kernel percentage 
-max_found = 2
-curr_pc = 0
-# Set up array for storing contour locations.  This is an array of zeros initially.  Later,
-# the places within the pc% kernel of the UD will be populated with ones
-for y_val in range(len(hr_contour)):
-    for x_val in range(len(hr_contour[0])):
-        hr_contour[y_val][x_val] = 0
-# Populate the places within the pc% kernel of the UD with ones
-while curr_pc < pc/100.0:
-    curr_max = 0
-    max_x = 0
-    max_y = 0
-    # Find the highest value in the array that is less than max_found.  This then becomes a 
-    for y_val in range(len(ud2)):
-        for x_val in range(len(ud2[0])):
-            if (ud2[y_val][x_val] > curr_max) and (ud2[y_val][x_val] < max_found):
-                curr_max = ud2[y_val][x_val]
-                max_x = x_val
-                max_y = y_val
-    # Set the output array at position where this max is found to 1
-    hr_contour[max_y][max_x] = 1
-    max_found = curr_max
-    curr_pc += max_found
-plt.contour(hr_contour, origin='lower',colors='b', extent=[0,len(ud2[0]),0,len(ud2)],levels=[0,1],linestyles='solid')
-plt.scatter(loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
-plt.xlabel('Easting',fontsize=20)
-plt.text(2,90,'d)',fontsize=26)
-
-# Save and show figure
-plt.savefig(savefile)
-plt.show()
\ No newline at end of file
+# Plot the results, unless the file for the plot is none (only calculate them)
+if savefile != 'none':
+    # Plot resource layer and locations.  The layer is contoured once and the same contours
+    # drawn on all four panels.
+    with htsu_profile.stage('import_matplotlib'):
+        plt = htsu_render.pyplot()
+    htsu_profile.begin('plotting')
+    layer_contours = htsu_render.LayerContours(z_array, htsu_render.layer_levels(bottomcontour, topcontour, contourres),
+                                               [0,box_width-1,0,box_height-1])
+    fig = plt.figure()
+    fig.set_size_inches(12,12)
+    fig.add_subplot(2,2,1)
+    filled_contours = layer_contours.draw(plt.gca())
+    plt.ylabel('Northing',fontsize=20)
+    # Make a colorbar 
+    #cbar = plt.colorbar(filled_contours)
+
+    # Plot locations as black dots
+    htsu_render.scatter(plt, loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
+    plt.text(2,90,'a)',fontsize=26)
+
+    # Plot estimated UD and locations: Equation (17)
+    fig.add_subplot(2,2,2)
+    # Plot resource layer
+    layer_contours.draw(plt.gca())
+    # Plot UD contours: 1 in the pc% home range
+    hr_contour = hr_contours[0]
+    plt.contour(hr_contour, origin='lower',colors='b', extent=[0,len(ud[0]),0,len(ud)],levels=[0,1],linestyles='solid')
+    htsu_render.scatter(plt, loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
+    plt.text(2,90,'b)',fontsize=26)
+
+    # Plot estimated UD and locations: Equation (18)
+    fig.add_subplot(2,2,3)
+    # Plot resource layer
+    layer_contours.draw(plt.gca())
+    # Plot UD contours: 1 in the pc% home range
+    hr_contour = hr_contours[1]
+    plt.contour(hr_contour, origin='lower',colors='b', extent=[0,len(ud1[0]),0,len(ud1)],levels=[0,1],linestyles='solid')
+    htsu_render.scatter(plt, loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
+    plt.xlabel('Easting',fontsize=20)
+    plt.ylabel('Northing',fontsize=20)
+    plt.text(2,90,'c)',fontsize=26)
+
+    # Plot estimated UD and locations: Equation (19)
+    fig.add_subplot(2,2,4)
+    # Plot resource layer
+    layer_contours.draw(plt.gca())
+    # Plot UD contours: 1 in the pc% home range
+    hr_contour = hr_contours[2]
+    plt.contour(hr_contour, origin='lower',colors='b', extent=[0,len(ud2[0]),0,len(ud2)],levels=[0,1],linestyles='solid')
+    htsu_render.scatter(plt, loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
+    plt.xlabel('Easting',fontsize=20)
+    plt.text(2,90,'d)',fontsize=26)
+
+    htsu_profile.end()
+
+    # Save figure
+    with htsu_profile.stage('savefig'):
+        plt.savefig(savefile)
@@ -5,27 +5,27 @@
 #          patterns: an approach via step selection" by JR Potts and L Borger
 #
 # Usage: python htsu_fig3.py htsu_sim_4paths_full.out htsu_sim_4paths_noavoid.out htsu_sim_4paths_nocp.out htsu_sim_4paths_nores.out random_field_100.inp 0 100 0 100 1 1 0 10 fig3.png
+#   Add exact at the end to calculate the KDEs by summing over every position, rather than by FFT.
+#   Giving none as the plot file (fig3.png) only calculates the KDEs (e.g. to fill the cache of
+#   htsu_cache.py), without importing matplotlib.
 #
 # Author: Jonathan R. Potts
 #
 # Feel free to share and adapt, but giving appropriate credit
 ################################################################################
 
-import sys,math,pylab,numpy,random
+import sys,numpy
+import htsu_layer, htsu_kde, htsu_kernel, htsu_traj, htsu_cache, htsu_render
 
-# Get filename of files containing animal positions and open for reading
-curr_arg = 1
-pos_file1 = open(sys.argv[curr_arg],'r')
-curr_arg += 1
-pos_file2 = open(sys.argv[curr_arg],'r')
-curr_arg += 1
-pos_file3 = open(sys.argv[curr_arg],'r')
-curr_arg += 1
-pos_file4 = open(sys.argv[curr_arg],'r')
+# Get filenames of files containing animal positions
+pos_files = []
+for plot_no in range(4):
+    curr_arg = plot_no + 1
+    pos_files += [sys.argv[curr_arg]]
 
 # Get resource layer
 curr_arg += 1
-resfile = open(sys.argv[curr_arg],'r')
+layerfile = sys.argv[curr_arg]
 
 # Get box left and right coords
 curr_arg += 1
@@ -59,300 +59,70 @@ subsampling = int(sys.argv[curr_arg])
 curr_arg += 1
 savefile = sys.argv[curr_arg]
 
+# Calculate the KDEs exactly rather than by binning and FFT (optional)
+curr_arg += 1
+exact = len(sys.argv) > curr_arg and sys.argv[curr_arg] == 'exact'
+
 # Get the resource layer
-z_array = [[]]
-resfile.seek(0)
-y_val = -1
-for line in resfile:
-    y_val += 1
-    if y_val != 0:
-        z_array += [[]]
-    split_line = line.rsplit()
-    for x_val in range(len(split_line)):
-        z_array[y_val] += [float(split_line[x_val])]
-resfile.close()
+z_array = htsu_layer.load_layer(layerfile)
 bottomcontour = -4
 topcontour = 4
 contourres = 1
 
-######################################################
-# First plot
-######################################################
-
-# Read in the positions from file
-x_array1 = []
-y_array1 = []
-x_array2 = []
-y_array2 = []
-x_array3 = []
-y_array3 = []
-x_array4 = []
-y_array4 = []
-row = 0
-pos_file1.seek(0)
-for line in pos_file1:
-    row += 1
-    split_line = line.rsplit()
-    if (row > start_val) and (row % subsampling == 0):
-        x_array1 += [float(split_line[0])+random.random()-0.5]
-        y_array1 += [float(split_line[1])+random.random()-0.5]
-        x_array2 += [float(split_line[2])+random.random()-0.5]
-        y_array2 += [float(split_line[3])+random.random()-0.5]
-        x_array3 += [float(split_line[4])+random.random()-0.5]
-        y_array3 += [float(split_line[5])+random.random()-0.5]
-        x_array4 += [float(split_line[6])+random.random()-0.5]
-        y_array4 += [float(split_line[7])+random.random()-0.5]
-pos_file1.close()
-
-# Calculate the smoothing parameters (h)
-h_val1 = math.sqrt((numpy.var(x_array1)+numpy.var(y_array1))/2)*(float(len(x_array1))**(-1.0/6.0))
-h_val2 = math.sqrt((numpy.var(x_array2)+numpy.var(y_array2))/2)*(float(len(x_array2))**(-1.0/6.0))
-h_val3 = math.sqrt((numpy.var(x_array3)+numpy.var(y_array3))/2)*(float(len(x_array3))**(-1.0/6.0))
-h_val4 = math.sqrt((numpy.var(x_array4)+numpy.var(y_array4))/2)*(float(len(x_array4))**(-1.0/6.0))
-
-# Calculate the KDEs
-pd1 =[[]]
-pd2 =[[]]
-pd3 =[[]]
-pd4 =[[]]
-for y_val in range(0,bb-bt):
-    if y_val != 0:
-        pd1 += [[]]
-        pd2 += [[]]
-        pd3 += [[]]
-        pd4 += [[]]
-    for x_val in range(0,br-bl):
-        pd1[y_val] += [0]
-        pd2[y_val] += [0]
-        pd3[y_val] += [0]
-        pd4[y_val] += [0]
-        for data in range(len(x_array1)):
-            pd1[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array1[data])**2+((y_val+bt)*lat_space-y_array1[data])**2)/(2*(h_val1**2)))/(2*math.pi*len(x_array1)*(h_val1**2))
-            pd2[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array2[data])**2+((y_val+bt)*lat_space-y_array2[data])**2)/(2*(h_val2**2)))/(2*math.pi*len(x_array2)*(h_val2**2))
-            pd3[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array3[data])**2+((y_val+bt)*lat_space-y_array3[data])**2)/(2*(h_val3**2)))/(2*math.pi*len(x_array3)*(h_val3**2))
-            pd4[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array4[data])**2+((y_val+bt)*lat_space-y_array4[data])**2)/(2*(h_val4**2)))/(2*math.pi*len(x_array4)*(h_val4**2))
-
-# Plot KDEs
-fig = pylab.figure()
-fig.set_size_inches(12,12)
-fig.add_subplot(2,2,1)
-pylab.hold('on')
-filled_contours = pylab.contourf(z_array, origin='lower', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=pylab.cm.Greens)
-pylab.ylabel('Northing',fontsize=20)
-pd_levels = [0.0001,0.0002,0.0005,0.001,0.002,0.005,0.01,0.1]
-pylab.contour(pd1, origin='lower',colors='k', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd2, origin='lower',colors='b', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd3, origin='lower',colors='y', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd4, origin='lower',colors='m', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.text(2,93,'a)',fontsize=26)
-
-######################################################
-# Second plot
-######################################################
-
-# Read in the positions from file
-x_array1 = []
-y_array1 = []
-x_array2 = []
-y_array2 = []
-x_array3 = []
-y_array3 = []
-x_array4 = []
-y_array4 = []
-row = 0
-pos_file2.seek(0)
-for line in pos_file2:
-    row += 1
-    split_line = line.rsplit()
-    if (row > start_val) and (row % subsampling == 0):
-        x_array1 += [float(split_line[0])+random.random()-0.5]
-        y_array1 += [float(split_line[1])+random.random()-0.5]
-        x_array2 += [float(split_line[2])+random.random()-0.5]
-        y_array2 += [float(split_line[3])+random.random()-0.5]
-        x_array3 += [float(split_line[4])+random.random()-0.5]
-        y_array3 += [float(split_line[5])+random.random()-0.5]
-        x_array4 += [float(split_line[6])+random.random()-0.5]
-        y_array4 += [float(split_line[7])+random.random()-0.5]
-pos_file2.close()
-
-# Calculate the smoothing parameters (h)
-h_val1 = math.sqrt((numpy.var(x_array1)+numpy.var(y_array1))/2)*(float(len(x_array1))**(-1.0/6.0))
-h_val2 = math.sqrt((numpy.var(x_array2)+numpy.var(y_array2))/2)*(float(len(x_array2))**(-1.0/6.0))
-h_val3 = math.sqrt((numpy.var(x_array3)+numpy.var(y_array3))/2)*(float(len(x_array3))**(-1.0/6.0))
-h_val4 = math.sqrt((numpy.var(x_array4)+numpy.var(y_array4))/2)*(float(len(x_array4))**(-1.0/6.0))
-
-# Calculate the KDEs
-pd1 =[[]]
-pd2 =[[]]
-pd3 =[[]]
-pd4 =[[]]
-for y_val in range(0,bb-bt):
-    if y_val != 0:
-        pd1 += [[]]
-        pd2 += [[]]
-        pd3 += [[]]
-        pd4 += [[]]
-    for x_val in range(0,br-bl):
-        pd1[y_val] += [0]
-        pd2[y_val] += [0]
-        pd3[y_val] += [0]
-        pd4[y_val] += [0]
-        for data in range(len(x_array1)):
-            pd1[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array1[data])**2+((y_val+bt)*lat_space-y_array1[data])**2)/(2*(h_val1**2)))/(2*math.pi*len(x_array1)*(h_val1**2))
-            pd2[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array2[data])**2+((y_val+bt)*lat_space-y_array2[data])**2)/(2*(h_val2**2)))/(2*math.pi*len(x_array2)*(h_val2**2))
-            pd3[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array3[data])**2+((y_val+bt)*lat_space-y_array3[data])**2)/(2*(h_val3**2)))/(2*math.pi*len(x_array3)*(h_val3**2))
-            pd4[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array4[data])**2+((y_val+bt)*lat_space-y_array4[data])**2)/(2*(h_val4**2)))/(2*math.pi*len(x_array4)*(h_val4**2))
-
-# Plot KDEs
-fig.add_subplot(2,2,2)
-pylab.hold('on')
-pd_levels = [0.0001,0.0002,0.0005,0.001,0.002,0.005,0.01,0.1]
-filled_contours = pylab.contourf(z_array, origin='lower', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=pylab.cm.Greens)
-pylab.contour(pd1, origin='lower',colors='k', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd2, origin='lower',colors='b', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd3, origin='lower',colors='y', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd4, origin='lower',colors='m', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.text(2,93,'b)',fontsize=26)
-
-######################################################
-# Third plot
-######################################################
-
-# Read in the positions from file
-x_array1 = []
-y_array1 = []
-x_array2 = []
-y_array2 = []
-x_array3 = []
-y_array3 = []
-x_array4 = []
-y_array4 = []
-row = 0
-pos_file3.seek(0)
-for line in pos_file3:
-    row += 1
-    split_line = line.rsplit()
-    if (row > start_val) and (row % subsampling == 0):
-        x_array1 += [float(split_line[0])+random.random()-0.5]
-        y_array1 += [float(split_line[1])+random.random()-0.5]
-        x_array2 += [float(split_line[2])+random.random()-0.5]
-        y_array2 += [float(split_line[3])+random.random()-0.5]
-        x_array3 += [float(split_line[4])+random.random()-0.5]
-        y_array3 += [float(split_line[5])+random.random()-0.5]
-        x_array4 += [float(split_line[6])+random.random()-0.5]
-        y_array4 += [float(split_line[7])+random.random()-0.5]
-pos_file3.close()
-
-# Calculate the smoothing parameters (h)
-h_val1 = math.sqrt((numpy.var(x_array1)+numpy.var(y_array1))/2)*(float(len(x_array1))**(-1.0/6.0))
-h_val2 = math.sqrt((numpy.var(x_array2)+numpy.var(y_array2))/2)*(float(len(x_array2))**(-1.0/6.0))
-h_val3 = math.sqrt((numpy.var(x_array3)+numpy.var(y_array3))/2)*(float(len(x_array3))**(-1.0/6.0))
-h_val4 = math.sqrt((numpy.var(x_array4)+numpy.var(y_array4))/2)*(float(len(x_array4))**(-1.0/6.0))
-
-# Calculate the KDEs
-pd1 =[[]]
-pd2 =[[]]
-pd3 =[[]]
-pd4 =[[]]
-for y_val in range(0,bb-bt):
-    if y_val != 0:
-        pd1 += [[]]
-        pd2 += [[]]
-        pd3 += [[]]
-        pd4 += [[]]
-    for x_val in range(0,br-bl):
-        pd1[y_val] += [0]
-        pd2[y_val] += [0]
-        pd3[y_val] += [0]
-        pd4[y_val] += [0]
-        for data in range(len(x_array1)):
-            pd1[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array1[data])**2+((y_val+bt)*lat_space-y_array1[data])**2)/(2*(h_val1**2)))/(2*math.pi*len(x_array1)*(h_val1**2))
-            pd2[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array2[data])**2+((y_val+bt)*lat_space-y_array2[data])**2)/(2*(h_val2**2)))/(2*math.pi*len(x_array2)*(h_val2**2))
-            pd3[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array3[data])**2+((y_val+bt)*lat_space-y_array3[data])**2)/(2*(h_val3**2)))/(2*math.pi*len(x_array3)*(h_val3**2))
-            pd4[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array4[data])**2+((y_val+bt)*lat_space-y_array4[data])**2)/(2*(h_val4**2)))/(2*math.pi*len(x_array4)*(h_val4**2))
-
-# Plot KDEs
-fig.add_subplot(2,2,3)
-pylab.hold('on')
-filled_contours = pylab.contourf(z_array, origin='lower', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=pylab.cm.Greens)
-pylab.ylabel('Northing',fontsize=20)
-pylab.xlabel('Easting',fontsize=20)
-pd_levels = [0.0001,0.0002,0.0005,0.001,0.002,0.005,0.01,0.1]
-pylab.contour(pd1, origin='lower',colors='k', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd2, origin='lower',colors='b', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd3, origin='lower',colors='y', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd4, origin='lower',colors='m', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.text(2,93,'c)',fontsize=26)
-
-######################################################
-# Fourth plot
-######################################################
-
-# Read in the positions from file
-x_array1 = []
-y_array1 = []
-x_array2 = []
-y_array2 = []
-x_array3 = []
-y_array3 = []
-x_array4 = []
-y_array4 = []
-row = 0
-pos_file4.seek(0)
-for line in pos_file4:
-    row += 1
-    split_line = line.rsplit()
-    if (row > start_val) and (row % subsampling == 0):
-        x_array1 += [float(split_line[0])+random.random()-0.5]
-        y_array1 += [float(split_line[1])+random.random()-0.5]
-        x_array2 += [float(split_line[2])+random.random()-0.5]
-        y_array2 += [float(split_line[3])+random.random()-0.5]
-        x_array3 += [float(split_line[4])+random.random()-0.5]
-        y_array3 += [float(split_line[5])+random.random()-0.5]
-        x_array4 += [float(split_line[6])+random.random()-0.5]
-        y_array4 += [float(split_line[7])+random.random()-0.5]
-pos_file4.close()
-
-# Calculate the smoothing parameters (h)
-h_val1 = math.sqrt((numpy.var(x_array1)+numpy.var(y_array1))/2)*(float(len(x_array1))**(-1.0/6.0))
-h_val2 = math.sqrt((numpy.var(x_array2)+numpy.var(y_array2))/2)*(float(len(x_array2))**(-1.0/6.0))
-h_val3 = math.sqrt((numpy.var(x_array3)+numpy.var(y_array3))/2)*(float(len(x_array3))**(-1.0/6.0))
-h_val4 = math.sqrt((numpy.var(x_array4)+numpy.var(y_array4))/2)*(float(len(x_array4))**(-1.0/6.0))
-
-# Calculate the KDEs
-pd1 =[[]]
-pd2 =[[]]
-pd3 =[[]]
-pd4 =[[]]
-for y_val in range(0,bb-bt):
-    if y_val != 0:
-        pd1 += [[]]
-        pd2 += [[]]
-        pd3 += [[]]
-        pd4 += [[]]
-    for x_val in range(0,br-bl):
-        pd1[y_val] += [0]
-        pd2[y_val] += [0]
-        pd3[y_val] += [0]
-        pd4[y_val] += [0]
-        for data in range(len(x_array1)):
-            pd1[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array1[data])**2+((y_val+bt)*lat_space-y_array1[data])**2)/(2*(h_val1**2)))/(2*math.pi*len(x_array1)*(h_val1**2))
-            pd2[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array2[data])**2+((y_val+bt)*lat_space-y_array2[data])**2)/(2*(h_val2**2)))/(2*math.pi*len(x_array2)*(h_val2**2))
-            pd3[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array3[data])**2+((y_val+bt)*lat_space-y_array3[data])**2)/(2*(h_val3**2)))/(2*math.pi*len(x_array3)*(h_val3**2))
-            pd4[y_val][x_val] += (1/(unit**2))*math.exp(-(((x_val+bl)*lat_space-x_array4[data])**2+((y_val+bt)*lat_space-y_array4[data])**2)/(2*(h_val4**2)))/(2*math.pi*len(x_array4)*(h_val4**2))
-
-# Plot KDEs
-fig.add_subplot(2,2,4)
-pylab.hold('on')
-filled_contours = pylab.contourf(z_array, origin='lower', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=pylab.cm.Greens)
-pylab.xlabel('Easting',fontsize=20)
+# Lettering, axis labels and colours of the four plots, and the colours of the KDEs of
+# the four individuals
+plot_texts = ['a)','b)','c)','d)']
+plot_ylabels = [True,False,True,False]
+plot_xlabels = [False,False,True,True]
+indiv_colors = ['k','b','y','m']
+extent = [0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit]
 pd_levels = [0.0001,0.0002,0.0005,0.001,0.002,0.005,0.01,0.1]
-pylab.contour(pd1, origin='lower',colors='k', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd2, origin='lower',colors='b', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd3, origin='lower',colors='y', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.contour(pd4, origin='lower',colors='m', extent=[0,(br-bl)*lat_space*unit,0,(bb-bt)*lat_space*unit],levels=pd_levels,linewidths=2)
-pylab.text(2,93,'d)',fontsize=26)
 
-# Save and show figure
-pylab.savefig(savefile)
-pylab.show()
\ No newline at end of file
+# Positions after start_val, every subsampling rows, of each file (read only if a KDE is not cached)
+positions = []
+
+# Calculate the KDEs of the four individuals in a file
+def file_kdes(plot_no):
+    # Read in all the files at once, the first time that any are needed
+    if not positions:
+        positions.extend(htsu_traj.read_positions(pos_files, start_val, subsampling))
+    # Add random jitter to account for the fact that locations may be at any point within a pixel
+    x_arrays = [x_array + numpy.random.random(len(x_array)) - 0.5 for x_array, y_array in positions[plot_no]]
+    y_arrays = [y_array + numpy.random.random(len(y_array)) - 0.5 for x_array, y_array in positions[plot_no]]
+
+    # Calculate the KDEs, with the smoothing parameters (h) given by htsu_kde.bandwidth
+    return [htsu_kde.kde(x_arrays[indiv], y_arrays[indiv], br-bl, bb-bt, left=bl, top=bt,
+                         lat_space=lat_space, unit=unit, exact=exact) for indiv in range(4)]
+
+# The KDEs are kept on disk between runs (if HTSU_CACHE_DIR is set), keyed by the content of the
+# position files and the parameters, so that they are only recalculated when these change
+cache = htsu_cache.ArrayCache()
+
+pds_list = [cache.get('fig3_kdes', lambda: file_kdes(plot_no), htsu_cache.file_digest(pos_files[plot_no]),
+                      bl, br, bt, bb, lat_space, unit, start_val, subsampling, exact, htsu_kde, htsu_kernel, htsu_traj)
+            for plot_no in range(4)]
+sys.stderr.write(cache.report() + '\n')
+
+# Plot the results, unless the file for the plot is none (only calculate them)
+if savefile != 'none':
+    # Plot the KDEs over the resource layer, which is contoured once for all four panels
+    plt = htsu_render.pyplot()
+    layer_contours = htsu_render.LayerContours(z_array, htsu_render.layer_levels(bottomcontour, topcontour, contourres), extent)
+    fig = plt.figure()
+    fig.set_size_inches(12,12)
+    for plot_no in range(4):
+        pds = pds_list[plot_no]
+
+        # Plot KDEs
+        fig.add_subplot(2,2,plot_no+1)
+        layer_contours.draw(plt.gca())
+        if plot_ylabels[plot_no]:
+            plt.ylabel('Northing',fontsize=20)
+        if plot_xlabels[plot_no]:
+            plt.xlabel('Easting',fontsize=20)
+        for indiv in range(4):
+            plt.contour(pds[indiv], origin='lower',colors=indiv_colors[indiv], extent=extent,levels=pd_levels,linewidths=2)
+        plt.text(2,93,plot_texts[plot_no],fontsize=26)
+
+    # Save figure
+    plt.savefig(savefile)
@@ -11,7 +11,7 @@
 ################################################################################
 
 import sys
-from matplotlib import pyplot as plt
+import htsu_render
 
 # Get input file from command line
 curr_arg = 1
@@ -41,8 +41,8 @@ for curr_line in infile:
     agg_back += [float(split_line[3])]
   
 # Plot the data
+plt = htsu_render.pyplot()
 plt.subplot(1,2,1)
-plt.hold('on')
 fig = plt.gcf()
 fig.set_size_inches(12,5)
 plt.axis([1.45,3.55,15,35])
@@ -68,5 +68,4 @@ plt.plot([beta_max,beta_max],[15,100],'b--',linewidth=1,label=r"$a_{\rm max}$")
 plt.legend(loc=7, fontsize=14)
 
 # Save and show figure
-plt.savefig(savefile)
-plt.show()                  
\ No newline at end of file
+plt.savefig(savefile)                  
\ No newline at end of file
@@ -0,0 +1,53 @@
+###############################################################################
+# Name: htsu_homerange.py
+#
+# Purpose: Home ranges (isopleths) of a utilisation distribution (UD): the pc% home
+#          range is the smallest set of cells, taken in decreasing order of UD, that
+#          holds pc% of the UD.  The cells are sorted once and the cumulative sum
+#          gives every percentage in the same pass, in O(N log N), rather than
+#          rescanning the grid for the next-largest cell each time.  Cells with equal
+#          UD are always either all in or all out of a home range, so the result
+#          does not depend on the order of ties.  Any UD grid will do (a simulated
+#          KDE, a Barnett-Moorcroft UD or a master equation solution); it need not be
+#          normalised.
+#
+# Usage: from htsu_homerange import home_range, home_range_contour
+#   masks, areas = home_range(ud, [50, 95])
+#   hr_contour = home_range_contour(ud, [50, 95])   # 2 in the 50% range, 1 in the 95% only
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import numpy
+
+
+# UD value at the edge of the pc% home range, for each pc in percentages.  Cells are
+# added in decreasing order of UD while the share of the UD already added is below pc%,
+# so the last cell added is the one that takes the total to pc% or more.
+def isopleth_thresholds(ud, percentages):
+    flat_ud = numpy.asarray(ud, dtype=numpy.float64).ravel()
+    sorted_ud = numpy.sort(flat_ud)[::-1]
+    cum_before = (numpy.cumsum(sorted_ud) - sorted_ud)/flat_ud.sum()
+    thresholds = []
+    for pc in percentages:
+        cell_no = max(int(numpy.searchsorted(cum_before, pc/100.0, side='left')), 1)
+        thresholds += [sorted_ud[cell_no-1]]
+    return thresholds
+
+
+# Masks of the cells in the pc% home range, for each pc in percentages, and their areas
+# (the number of cells times cell_area)
+def home_range(ud, percentages, cell_area=1):
+    ud = numpy.asarray(ud, dtype=numpy.float64)
+    masks = [ud >= threshold for threshold in isopleth_thresholds(ud, percentages)]
+    areas = [int(mask.sum())*cell_area for mask in masks]
+    return masks, areas
+
+
+# Number of the home ranges in percentages that contain each cell.  This can be drawn
+# with plt.contour, so that each level is the boundary of one home range.
+def home_range_contour(ud, percentages):
+    masks, areas = home_range(ud, percentages)
+    return numpy.sum(masks, axis=0)
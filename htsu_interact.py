@@ -0,0 +1,137 @@
+###############################################################################
+# Name: htsu_interact.py
+#
+# Purpose: Simulate interacting individuals moving through a resource layer, as in
+#          htsu_sim_2indivs.py, for any number of individuals.  Each step, every
+#          individual moves to one of its four nearest neighbours with probability
+#          proportional to
+#
+#            exp(beta_R*R(z)) * exp(-beta_interact*(sum of the others' ODs at z)),
+#
+#          where the occurrence distribution (OD) of an individual is the share of
+#          its last no_steps_for_od steps spent in each cell.  beta_interact > 0 gives
+#          mutual avoidance and beta_interact < 0 mutual attraction.  The state
+#          (positions and ODs) is kept between calls to run, so a simulation can be
+#          continued with a different beta_interact.
+#
+#          The ODs are stored as arrays, alongside a running sum of all of them, so
+#          the others' OD at a cell is one subtraction rather than a loop over the
+#          other individuals, and the positions leaving the OD window are kept in a
+#          ring buffer.  As the ODs only change once everyone has moved, all the
+#          individuals move at once, so a step costs O(no_indivs) array operations.
+#
+# Usage: from htsu_interact import InteractingWalkers
+#   walkers = InteractingWalkers(exp_layer, 2, 1000, 10000)
+#   locations = walkers.run(20000, burn_in=15000)
+#   # locations[step][indiv] is the (x,y) position of each individual after burn_in
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import numpy
+import htsu_sample
+
+# Moves in the order they are tried: up, down, left, right
+MOVES_X = numpy.array([0, 0, -1, 1])
+MOVES_Y = numpy.array([-1, 1, 0, 0])
+
+# Number of steps of positions held before they are pushed into any KDE accumulators
+ACCUMULATOR_BLOCK = 4096
+
+
+class InteractingWalkers:
+
+    # Set up no_indivs individuals on the habitat given by exp_layer = exp(beta_R*R).
+    # start is a list of (x,y) start positions; by default they are spaced evenly along
+    # the middle row (for two individuals, the centres of the left- and right-hand halves
+    # of the domain, as in htsu_sim_2indivs.py).  Each OD starts as 1 at the start cell.
+    def __init__(self, exp_layer, no_indivs, beta_interact, no_steps_for_od, start=None, seed=None):
+        self.exp_layer = numpy.asarray(exp_layer, dtype=numpy.float64)
+        self.box_height, self.box_width = self.exp_layer.shape
+        self.no_indivs = no_indivs
+        self.beta_interact = beta_interact
+        self.no_steps_for_od = no_steps_for_od
+        # Amount to decrease OD by each step
+        self.dec_inc = 1/float(no_steps_for_od)
+        self.rng = numpy.random.default_rng(seed)
+        if start is None:
+            start = [((2*indiv + 1)*self.box_width//(2*no_indivs), self.box_height//2)
+                     for indiv in range(no_indivs)]
+        self.indivs = numpy.arange(no_indivs)
+        self.loc_x = numpy.array([start[indiv][0] for indiv in range(no_indivs)])
+        self.loc_y = numpy.array([start[indiv][1] for indiv in range(no_indivs)])
+        self.occurrence_dist = numpy.zeros((no_indivs, self.box_height, self.box_width))
+        self.occurrence_dist[self.indivs,self.loc_y,self.loc_x] = 1
+        # Running sum of all the ODs, so that the sum of the others' ODs at a cell is
+        # total_od minus the individual's own OD there, whatever the number of individuals
+        self.total_od = self.occurrence_dist.sum(axis=0)
+        # Ring buffer of the positions over the OD window: the position after step k is in
+        # slot k % no_steps_for_od, so the slot about to be overwritten holds the position
+        # that drops out of the window
+        self.history_x = numpy.zeros((no_steps_for_od, no_indivs), dtype=int)
+        self.history_y = numpy.zeros((no_steps_for_od, no_indivs), dtype=int)
+        self.history_x[0] = self.loc_x
+        self.history_y[0] = self.loc_y
+        self.step_count = 0
+
+    # Move every individual one step, using random_nos drawn uniformly from [0,1), one
+    # per individual.  The ODs are those from the end of the previous step, so all the
+    # individuals move at once.
+    def move(self, random_nos):
+        new_x = self.loc_x[:,numpy.newaxis] + MOVES_X
+        new_y = self.loc_y[:,numpy.newaxis] + MOVES_Y
+        # Can't move off the edge of the domain
+        inside = (new_x >= 0) & (new_x < self.box_width) & (new_y >= 0) & (new_y < self.box_height)
+        new_x = numpy.clip(new_x, 0, self.box_width - 1)
+        new_y = numpy.clip(new_y, 0, self.box_height - 1)
+        others_od = self.total_od[new_y,new_x] - self.occurrence_dist[self.indivs[:,numpy.newaxis],new_y,new_x]
+        probs = numpy.where(inside, self.exp_layer[new_y,new_x]*numpy.exp(-self.beta_interact*others_od), 0)
+        moves = htsu_sample.draw_indices(probs, random_nos)
+        self.loc_x = self.loc_x + MOVES_X[moves]
+        self.loc_y = self.loc_y + MOVES_Y[moves]
+
+    # Update the occurrence distributions once every individual has moved
+    def update_od(self):
+        self.step_count += 1
+        slot = self.step_count % self.no_steps_for_od
+        if self.step_count < self.no_steps_for_od:
+            # Within the first no_steps_for_od steps, so decrease the OD at the first step
+            slot = 0
+        first_x = self.history_x[slot]
+        first_y = self.history_y[slot]
+        # Deprecate the OD at the first position used to calculate this distribution, and
+        # increment it at the current position
+        numpy.add.at(self.occurrence_dist, (self.indivs, first_y, first_x), -self.dec_inc)
+        numpy.add.at(self.occurrence_dist, (self.indivs, self.loc_y, self.loc_x), self.dec_inc)
+        numpy.add.at(self.total_od, (first_y, first_x), -self.dec_inc)
+        numpy.add.at(self.total_od, (self.loc_y, self.loc_x), self.dec_inc)
+        self.history_x[self.step_count % self.no_steps_for_od] = self.loc_x
+        self.history_y[self.step_count % self.no_steps_for_od] = self.loc_y
+
+    # Simulate step_no steps, returning the positions after the first burn_in of them as
+    # an int array of shape (step_no-burn_in, no_indivs, 2).  If accumulators is given
+    # (a list of htsu_kde.KDEAccumulator, one per individual), every position is also
+    # pushed into them, a block of steps at a time.  progress (an htsu_profile.Progress)
+    # is updated after each step.
+    def run(self, step_no, burn_in=0, accumulators=None, progress=None):
+        locations = numpy.zeros((max(step_no - burn_in, 0), self.no_indivs, 2), dtype=int)
+        block = numpy.zeros((ACCUMULATOR_BLOCK, self.no_indivs, 2), dtype=int)
+        random_nos = self.rng.random((step_no, self.no_indivs))
+        for step in range(step_no):
+            self.move(random_nos[step])
+            self.update_od()
+            if step >= burn_in:
+                locations[step-burn_in,:,0] = self.loc_x
+                locations[step-burn_in,:,1] = self.loc_y
+            if accumulators is not None:
+                block_step = step % ACCUMULATOR_BLOCK
+                block[block_step,:,0] = self.loc_x
+                block[block_step,:,1] = self.loc_y
+                if block_step == ACCUMULATOR_BLOCK - 1 or step == step_no - 1:
+                    for indiv in range(self.no_indivs):
+                        accumulators[indiv].add(block[:block_step+1,indiv,0], block[:block_step+1,indiv,1])
+            if progress is not None:
+                progress.update()
+        return locations
@@ -0,0 +1,197 @@
+###############################################################################
+# Name: htsu_kde.py
+#
+# Purpose: Gaussian kernel density estimate (KDE) of animal positions on the lattice,
+#
+#            KDE(x) = sum over data of exp(-|x-X_i|^2/(2h^2)) / (2 pi n h^2 unit^2),
+#
+#          with the smoothing parameter h = sqrt((var_x+var_y)/2)*n^(-1/6) by default.
+#          The positions are first binned onto the lattice (each split linearly
+#          between its four nearest lattice points) and the binned counts are then
+#          convolved with the Gaussian by FFT, so the cost is O(n + N log N) for n
+#          positions and N lattice points rather than O(nN).  The binning changes the
+#          KDE by O(lat_space^2/h^2) relative to the exact sum, which is still
+#          available with exact=True.  The Gaussian is cut off at CUTOFF*h.
+#
+#          A KDEAccumulator builds the same KDE from positions pushed into it while a
+#          simulation runs, keeping only the binned counts and the running sums
+#          needed for h, so the positions never have to be stored or written out.
+#
+# Usage: from htsu_kde import kde
+#   pd = kde(x_array, y_array, 100, 100)
+#   pd = kde(x_array, y_array, br-bl, bb-bt, left=bl, top=bt, lat_space=1, unit=1)
+#   pd = kde(x_array, y_array, 100, 100, exact=True)
+#   accumulator = KDEAccumulator(100, 100, start_val=1000, subsampling=10)
+#   accumulator.add(loc_x, loc_y)   # once per step, or with arrays of consecutive positions
+#   pd = accumulator.density()
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import math
+import numpy
+import htsu_kernel
+
+# Radius, in units of h, beyond which the Gaussian is taken to be zero.  exp(-CUTOFF^2/2)
+# is about 4e-6 of the peak.
+CUTOFF = 5
+
+# Largest number of positions summed over at once by the exact KDE
+EXACT_CHUNK = 2**14
+
+
+# Smoothing parameter, h = sqrt((var_x+var_y)/2)*n^(-1/6)
+def bandwidth(x_array, y_array):
+    return math.sqrt((numpy.var(x_array)+numpy.var(y_array))/2)*(float(len(x_array))**(-1.0/6.0))
+
+
+# Gaussian exp(-(dx^2+dy^2)/(2h^2)), tabulated by lattice offset in the form used by
+# htsu_kernel.KernelConvolver: the value for offset (dx,dy) is at table[dy+radius][dx+radius]
+class GaussianKernel:
+
+    def __init__(self, h_val, lat_space=1):
+        self.radius = int(math.ceil(CUTOFF*h_val/lat_space))
+        self.radius_x = self.radius
+        self.radius_y = self.radius
+        gauss = numpy.exp(-(numpy.arange(-self.radius, self.radius+1)*lat_space)**2/(2*h_val**2))
+        self.table = numpy.outer(gauss, gauss)
+
+
+# Bin positions onto the box_width x box_height lattice whose point (x_val,y_val) is at
+# ((x_val+left)*lat_space, (y_val+top)*lat_space), splitting each position linearly
+# between its four nearest lattice points.  Positions more than a lattice spacing
+# outside the lattice are dropped.  Returns the (fractional) counts at each point.
+def bin_points(x_array, y_array, box_width, box_height, left=0, top=0, lat_space=1):
+    grid_x = numpy.asarray(x_array, dtype=numpy.float64)/lat_space - left
+    grid_y = numpy.asarray(y_array, dtype=numpy.float64)/lat_space - top
+    floor_x = numpy.floor(grid_x)
+    floor_y = numpy.floor(grid_y)
+    frac_x = grid_x - floor_x
+    frac_y = grid_y - floor_y
+    floor_x = floor_x.astype(numpy.int64)
+    floor_y = floor_y.astype(numpy.int64)
+    counts = numpy.zeros(box_width*box_height)
+    for dx, weight_x in ((0, 1-frac_x), (1, frac_x)):
+        for dy, weight_y in ((0, 1-frac_y), (1, frac_y)):
+            point_x = floor_x + dx
+            point_y = floor_y + dy
+            inside = (point_x >= 0) & (point_x < box_width) & (point_y >= 0) & (point_y < box_height)
+            counts += numpy.bincount(point_y[inside]*box_width + point_x[inside],
+                                     weights=(weight_x*weight_y)[inside], minlength=box_width*box_height)
+    return counts.reshape((box_height, box_width))
+
+
+# Smooth binned counts (from bin_points on a lattice extended by the Gaussian's radius
+# on each side) into the KDE on the box_width x box_height lattice, for n_points
+# positions in total
+def smooth_counts(counts, h_val, n_points, box_width, box_height, lat_space=1, unit=1):
+    kernel = GaussianKernel(h_val, lat_space)
+    convolver = htsu_kernel.KernelConvolver(kernel, counts.shape[1], counts.shape[0])
+    smoothed = numpy.maximum(convolver.convolve(counts), 0)
+    radius = kernel.radius
+    smoothed = smoothed[radius:radius+box_height, radius:radius+box_width]
+    return smoothed/(unit**2*2*math.pi*n_points*h_val**2)
+
+
+# KDE of the positions at the points of the box_width x box_height lattice whose point
+# (x_val,y_val) is at ((x_val+left)*lat_space, (y_val+top)*lat_space), returned as a
+# (box_height, box_width) array.  h_val defaults to bandwidth(x_array, y_array).
+def kde(x_array, y_array, box_width, box_height, left=0, top=0, lat_space=1, unit=1, h_val=None,
+        exact=False):
+    if h_val is None:
+        h_val = bandwidth(x_array, y_array)
+    if exact:
+        return kde_exact(x_array, y_array, box_width, box_height, left, top, lat_space, unit, h_val)
+    # Bin onto the lattice extended by the radius of the Gaussian, so that positions
+    # just outside the box still contribute
+    radius = GaussianKernel(h_val, lat_space).radius
+    counts = bin_points(x_array, y_array, box_width+2*radius, box_height+2*radius,
+                        left-radius, top-radius, lat_space)
+    return smooth_counts(counts, h_val, len(x_array), box_width, box_height, lat_space, unit)
+
+
+# KDE by summing over every position for every lattice point.  The Gaussian factorises
+# into x- and y-parts, so the sum is a matrix product over the positions.
+def kde_exact(x_array, y_array, box_width, box_height, left=0, top=0, lat_space=1, unit=1, h_val=None):
+    x_array = numpy.asarray(x_array, dtype=numpy.float64)
+    y_array = numpy.asarray(y_array, dtype=numpy.float64)
+    if h_val is None:
+        h_val = bandwidth(x_array, y_array)
+    lattice_x = (numpy.arange(box_width)+left)*lat_space
+    lattice_y = (numpy.arange(box_height)+top)*lat_space
+    pd = numpy.zeros((box_height, box_width))
+    for first in range(0, len(x_array), EXACT_CHUNK):
+        gauss_x = numpy.exp(-(lattice_x[numpy.newaxis,:]-x_array[first:first+EXACT_CHUNK,numpy.newaxis])**2/(2*h_val**2))
+        gauss_y = numpy.exp(-(lattice_y[numpy.newaxis,:]-y_array[first:first+EXACT_CHUNK,numpy.newaxis])**2/(2*h_val**2))
+        pd += numpy.dot(gauss_y.T, gauss_x)
+    return pd/(unit**2*2*math.pi*len(x_array)*h_val**2)
+
+
+class KDEAccumulator:
+
+    # Set up the accumulator for the KDE on the box_width x box_height lattice (with left,
+    # top, lat_space and unit as for kde).  Pushed positions are numbered from 1 and, as
+    # in htsu_fig3.py, position number row is used if row > start_val and
+    # row % subsampling == 0.  If jitter, each position used is moved uniformly at random
+    # within its pixel first.  Counts are binned onto the lattice extended by margin
+    # points on each side, to catch positions that lie just outside it.
+    def __init__(self, box_width, box_height, left=0, top=0, lat_space=1, unit=1, start_val=0,
+                 subsampling=1, jitter=True, margin=1, seed=None):
+        self.box_width = box_width
+        self.box_height = box_height
+        self.left = left
+        self.top = top
+        self.lat_space = lat_space
+        self.unit = unit
+        self.start_val = start_val
+        self.subsampling = subsampling
+        self.jitter = jitter
+        self.margin = margin
+        self.rng = numpy.random.default_rng(seed)
+        self.counts = numpy.zeros((box_height+2*margin, box_width+2*margin))
+        self.row = 0
+        self.n_points = 0
+        # Running sums of x, x^2, y and y^2 over the positions used, for h
+        self.sums = numpy.zeros(4)
+
+    # Push one position, or arrays of consecutive positions
+    def add(self, x_vals, y_vals):
+        x_vals = numpy.atleast_1d(numpy.asarray(x_vals, dtype=numpy.float64))
+        y_vals = numpy.atleast_1d(numpy.asarray(y_vals, dtype=numpy.float64))
+        rows = self.row + numpy.arange(1, len(x_vals)+1)
+        self.row += len(x_vals)
+        used = (rows > self.start_val) & (rows % self.subsampling == 0)
+        if not used.any():
+            return
+        x_vals = x_vals[used]
+        y_vals = y_vals[used]
+        if self.jitter:
+            x_vals = x_vals + self.rng.random(len(x_vals)) - 0.5
+            y_vals = y_vals + self.rng.random(len(y_vals)) - 0.5
+        self.counts += bin_points(x_vals, y_vals, self.box_width+2*self.margin, self.box_height+2*self.margin,
+                                  self.left-self.margin, self.top-self.margin, self.lat_space)
+        self.n_points += len(x_vals)
+        self.sums += [x_vals.sum(), (x_vals**2).sum(), y_vals.sum(), (y_vals**2).sum()]
+
+    # Smoothing parameter, as given by bandwidth for the positions used so far
+    def bandwidth(self):
+        mean_x, mean_xx, mean_y, mean_yy = self.sums/self.n_points
+        var_x = max(mean_xx - mean_x**2, 0)
+        var_y = max(mean_yy - mean_y**2, 0)
+        return math.sqrt((var_x+var_y)/2)*(float(self.n_points)**(-1.0/6.0))
+
+    # KDE of the positions used so far, with smoothing parameter h_val (by default from
+    # bandwidth)
+    def density(self, h_val=None):
+        if h_val is None:
+            h_val = self.bandwidth()
+        # Extend (or crop) the binned lattice to the radius of the Gaussian
+        extra = GaussianKernel(h_val, self.lat_space).radius - self.margin
+        if extra >= 0:
+            counts = numpy.pad(self.counts, extra)
+        else:
+            counts = self.counts[-extra:extra, -extra:extra]
+        return smooth_counts(counts, h_val, self.n_points, self.box_width, self.box_height,
+                             self.lat_space, self.unit)
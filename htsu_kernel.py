@@ -0,0 +1,226 @@
+###############################################################################
+# Name: htsu_kernel.py
+#
+# Purpose: Precomputed step-length kernel, phi(|x-z|) = exp(-lambda*|x-z|), for the
+#          step selection simulators.  On a lattice this factor depends only on the
+#          offset (dx,dy) between the start and end of the step, so it is tabulated
+#          once and each step just cuts the window of the table that lies over the
+#          landscape.
+#
+#          Optionally, the kernel can be truncated at a cutoff radius, given either
+#          directly or as a tolerance on the probability mass of phi that is thrown
+#          away.  Each step then only touches an O(r^2) window around the animal,
+#          whatever the size of the landscape.  The mass of phi actually discarded is
+#          kept in StepKernel.tail_mass.  This is the tail of the step-length term on
+#          its own: the habitat weights can change the discarded share of the full
+#          movement kernel by at most a factor of max(w)/min(w).
+#
+#          For correlated walks, BearingKernelCache also tabulates the von Mises
+#          factor exp(kappa*cos(alpha_x-alpha_z)).  The bearing alpha_z of a step
+#          depends only on its offset, so it is calculated once, and the previous
+#          bearing alpha_x is rounded to one of n_bins equally spaced bearings, with
+#          one kernel table (step length times von Mises factor) for each.  Rounding
+#          changes each weight by a factor of at most exp(kappa*pi/n_bins), given as
+#          BearingKernelCache.max_error = exp(kappa*pi/n_bins)-1.
+#
+# Usage: from htsu_kernel import StepKernel
+#   kernel = StepKernel(0.2, box_width, box_height)
+#   kernel = StepKernel(0.2, box_width, box_height, tolerance=1e-6)
+#   kernel_window, (y0, y1, x0, x1) = kernel.window(loc_x, loc_y, box_width, box_height)
+#   weights = kernel_window*exp_layer[y0:y1, x0:x1]
+#   cache = BearingKernelCache(kernel, 2.0, n_bins=360)
+#   kernel_window, (y0, y1, x0, x1) = cache.window(alpha_x, loc_x, loc_y, box_width, box_height)
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import math, collections
+import numpy
+
+
+# Table of exp(-lambda*sqrt(dx^2+dy^2)) for all offsets with |dx| <= radius_x and
+# |dy| <= radius_y.  The value for offset (dx,dy) is at table[dy+radius_y][dx+radius_x].
+def step_kernel_table(lambda_val, radius_x, radius_y):
+    dx = numpy.arange(-radius_x, radius_x+1, dtype=numpy.float64)
+    dy = numpy.arange(-radius_y, radius_y+1, dtype=numpy.float64)
+    return numpy.exp(-lambda_val*numpy.hypot(dx[numpy.newaxis,:], dy[:,numpy.newaxis]))
+
+
+# Total of exp(-lambda*sqrt(dx^2+dy^2)) over each square ring of offsets with
+# max(|dx|,|dy|) = c, for c = 0, 1, ..., max_radius.  Rings beyond the point where
+# they no longer change the total in double precision are left out.
+def ring_masses(lambda_val, max_radius):
+    masses = [1.0]
+    total = 1.0
+    for ring in range(1, max_radius+1):
+        side = numpy.exp(-lambda_val*numpy.hypot(ring, numpy.arange(-ring, ring+1)))
+        # Four sides, with the four corners counted once each
+        mass = 4*side.sum() - 4*side[0]
+        masses += [mass]
+        total += mass
+        if lambda_val*ring > 2 and mass < 1e-17*total:
+            break
+    return numpy.array(masses)
+
+
+# Share of the mass of phi lying beyond each radius: tail[r] is the mass of the
+# offsets with max(|dx|,|dy|) > r, divided by the total up to max_radius
+def tail_masses(lambda_val, max_radius):
+    masses = ring_masses(lambda_val, max_radius)
+    # Sum from the outside in, so that small tails are not lost to rounding
+    outer = numpy.cumsum(masses[::-1])[::-1]
+    tail = numpy.zeros(max_radius+1)
+    tail[:len(masses)-1] = outer[1:]/outer[0]
+    return tail
+
+
+# Smallest radius whose discarded tail of phi is at most tolerance
+def kernel_radius(lambda_val, tolerance, max_radius):
+    tail = tail_masses(lambda_val, max_radius)
+    return int(numpy.argmax(tail <= tolerance))
+
+
+class StepKernel:
+
+    # Tabulate the kernel for the offsets that can occur on a box_width x box_height
+    # landscape.  By default every offset is kept.  Giving radius (in cells), or a
+    # tolerance on the discarded mass from which the radius is found, truncates the
+    # kernel to offsets with |dx| <= radius and |dy| <= radius.
+    def __init__(self, lambda_val, box_width, box_height, radius=None, tolerance=None):
+        self.lambda_val = lambda_val
+        max_radius = max(box_width, box_height) - 1
+        if radius is None and tolerance is not None:
+            radius = kernel_radius(lambda_val, tolerance, max_radius)
+        if radius is None:
+            radius = max_radius
+        self.radius = min(int(radius), max_radius)
+        self.radius_x = min(self.radius, box_width - 1)
+        self.radius_y = min(self.radius, box_height - 1)
+        self.tail_mass = tail_masses(lambda_val, max_radius)[self.radius]
+        self.table = step_kernel_table(lambda_val, self.radius_x, self.radius_y)
+
+    # Get the kernel values for a step from (x,y), together with the rows y0:y1 and
+    # columns x0:x1 of the landscape that they cover.  kernel_window[to_y-y0][to_x-x0]
+    # is the value of phi for a step from (x,y) to (to_x,to_y).
+    def window(self, x, y, box_width, box_height):
+        x, y = int(x), int(y)
+        x0 = max(0, x - self.radius_x)
+        x1 = min(box_width, x + self.radius_x + 1)
+        y0 = max(0, y - self.radius_y)
+        y1 = min(box_height, y + self.radius_y + 1)
+        kernel_window = self.table[y0-y+self.radius_y:y1-y+self.radius_y,
+                                   x0-x+self.radius_x:x1-x+self.radius_x]
+        return kernel_window, (y0, y1, x0, x1)
+
+
+# Bearing atan2(dy,dx) of each offset in a table with the given radii, laid out as in
+# step_kernel_table.  The bearing of the zero offset is taken to be 0.
+def offset_bearing_table(radius_x, radius_y):
+    dy, dx = numpy.mgrid[-radius_y:radius_y+1, -radius_x:radius_x+1]
+    return numpy.arctan2(dy, dx)
+
+
+# Number of bearing bins needed for the rounding of the previous bearing to change the
+# von Mises factor by at most a relative error of tolerance
+def bearing_bins(kappa, tolerance):
+    if kappa == 0:
+        return 1
+    return max(1, int(math.ceil(abs(kappa)*math.pi/math.log1p(tolerance))))
+
+
+class BearingKernelCache:
+
+    # Tables of the StepKernel kernel times exp(kappa*cos(bearing-alpha_z)) for n_bins
+    # bearings 2*pi*k/n_bins, k = 0, ..., n_bins-1.  Either n_bins or tolerance (the
+    # largest relative error in the weights allowed, from which n_bins is found) can be
+    # given; the default is 360 bins.  Tables are built when first used, and at most
+    # max_tables are kept at once (the least recently used are dropped).
+    def __init__(self, kernel, kappa, n_bins=None, tolerance=None, max_tables=512):
+        if n_bins is None:
+            n_bins = bearing_bins(kappa, tolerance) if tolerance is not None else 360
+        self.kernel = kernel
+        self.kappa = kappa
+        self.n_bins = n_bins
+        self.max_error = math.expm1(abs(kappa)*math.pi/n_bins)
+        self.max_tables = max_tables
+        self.radius_x = kernel.radius_x
+        self.radius_y = kernel.radius_y
+        self.offset_bearing = offset_bearing_table(kernel.radius_x, kernel.radius_y)
+        self.tables = collections.OrderedDict()
+
+    # Bin of the bearing alpha_x (in radians, any range)
+    def bin(self, alpha_x):
+        return int(round(alpha_x*self.n_bins/(2*math.pi))) % self.n_bins
+
+    # Kernel table for the bin of the previous bearing alpha_x
+    def table(self, alpha_x):
+        bin_no = self.bin(alpha_x)
+        if bin_no in self.tables:
+            self.tables.move_to_end(bin_no)
+        else:
+            bearing = 2*math.pi*bin_no/self.n_bins
+            self.tables[bin_no] = self.kernel.table*numpy.exp(self.kappa*numpy.cos(bearing - self.offset_bearing))
+            if len(self.tables) > self.max_tables:
+                self.tables.popitem(last=False)
+        return self.tables[bin_no]
+
+    # Tables for every bin at once, as an array of shape (n_bins, 2*radius_y+1, 2*radius_x+1)
+    def all_tables(self):
+        bearings = 2*numpy.pi*numpy.arange(self.n_bins)/self.n_bins
+        return self.kernel.table*numpy.exp(self.kappa*numpy.cos(bearings[:,numpy.newaxis,numpy.newaxis] -
+                                                                self.offset_bearing))
+
+    # As StepKernel.window, for a step from (x,y) whose previous bearing was alpha_x
+    def window(self, alpha_x, x, y, box_width, box_height):
+        x, y = int(x), int(y)
+        x0 = max(0, x - self.radius_x)
+        x1 = min(box_width, x + self.radius_x + 1)
+        y0 = max(0, y - self.radius_y)
+        y1 = min(box_height, y + self.radius_y + 1)
+        kernel_window = self.table(alpha_x)[y0-y+self.radius_y:y1-y+self.radius_y,
+                                            x0-x+self.radius_x:x1-x+self.radius_x]
+        return kernel_window, (y0, y1, x0, x1)
+
+
+# Smallest n' >= n whose only prime factors are 2, 3 and 5, for which FFTs are fast
+def fast_length(n):
+    best = 2*n
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+class KernelConvolver:
+
+    # Set up the convolution of a StepKernel with grids on a box_width x box_height
+    # landscape.  The grids are zero-padded so that the FFT gives the linear (not
+    # circular) convolution, and the transform of the kernel table is kept so that it
+    # is only calculated once however many grids are convolved.
+    def __init__(self, kernel, box_width, box_height):
+        self.kernel = kernel
+        self.box_width = box_width
+        self.box_height = box_height
+        self.fft_shape = (fast_length(box_height + 2*kernel.radius_y),
+                          fast_length(box_width + 2*kernel.radius_x))
+        self.kernel_fft = numpy.fft.rfft2(kernel.table, s=self.fft_shape)
+
+    # Calculate sum_z phi(|x-z|)*grid(z) over the landscape for every cell x.  This is
+    # exact up to the rounding error of the FFT, which is of order 1e-16 times the
+    # largest value in the result.  Callers that need a non-negative result from a
+    # non-negative grid should therefore set any (tiny) negative values to zero.
+    def convolve(self, grid):
+        grid_fft = numpy.fft.rfft2(grid, s=self.fft_shape)
+        full = numpy.fft.irfft2(grid_fft*self.kernel_fft, s=self.fft_shape)
+        result = full[self.kernel.radius_y:self.kernel.radius_y+self.box_height,
+                      self.kernel.radius_x:self.kernel.radius_x+self.box_width]
+        return result
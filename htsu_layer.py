@@ -0,0 +1,83 @@
+###############################################################################
+# Name: htsu_layer.py
+#
+# Purpose: Shared loader for the resource layers (random_field_*.inp).  Layers are
+#          parsed straight into contiguous float64 arrays, and a binary copy of the
+#          array is kept next to the .inp file (e.g. random_field_100.inp.npy) so
+#          that later runs can memory-map it rather than parse the text again.
+#
+# Usage: from htsu_layer import load_layer, exp_layer
+#   r_array = load_layer('random_field_100.inp')
+#   exp_r = exp_layer(r_array, 1.5)
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import os
+import numpy
+
+# Suffix of the binary cache written alongside each layer file
+CACHE_SUFFIX = '.npy'
+
+
+# Name of the binary cache belonging to a layer file
+def cache_name(filename):
+    return filename + CACHE_SUFFIX
+
+
+# Parse a tab-separated layer file into a 2D float64 array, where array[y][x] is the
+# value in row y and column x of the file
+def parse_layer(filename):
+    return numpy.ascontiguousarray(numpy.loadtxt(filename, dtype=numpy.float64, ndmin=2))
+
+
+# Write the binary cache for a layer.  The array is written to a temporary file first
+# so that a run that is interrupted never leaves a half-written cache behind.  Failing
+# to write the cache (e.g. in a read-only directory) is not an error.
+def write_cache(filename, array):
+    cachefile = cache_name(filename)
+    tmpfile = cachefile + '.%i.tmp' % os.getpid()
+    try:
+        with open(tmpfile, 'wb') as outfile:
+            numpy.save(outfile, array)
+        os.replace(tmpfile, cachefile)
+    except OSError:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+
+# Load a layer, using the binary cache if it is at least as new as the text file.
+# With mmap=True the cached array is memory-mapped read-only rather than read into
+# memory.  The cache is (re)written whenever the text file has to be parsed.
+def load_layer(filename, use_cache=True, mmap=True):
+    cachefile = cache_name(filename)
+    if (use_cache and os.path.exists(cachefile) and
+            os.path.getmtime(cachefile) >= os.path.getmtime(filename)):
+        try:
+            return numpy.load(cachefile, mmap_mode='r' if mmap else None)
+        except (OSError, ValueError):
+            # Unreadable cache: fall back to parsing the text file
+            pass
+    array = parse_layer(filename)
+    if use_cache:
+        write_cache(filename, array)
+    return array
+
+
+# Calculate exp(beta*R(x)) for every cell of the layer R
+def exp_layer(r_array, beta):
+    return numpy.exp(beta*numpy.asarray(r_array, dtype=numpy.float64))
+
+
+# Calculate |x-x_C| for every cell x of a box_width x box_height landscape, where
+# x_C=(xc,yc) is the central place
+def central_place_distance(box_width, box_height, xc, yc):
+    grid_y, grid_x = numpy.mgrid[0:box_height, 0:box_width]
+    return numpy.hypot(grid_x-xc, grid_y-yc)
+
+
+# Calculate exp(-beta_c*|x-x_C|) for every cell x of a box_width x box_height landscape
+def central_place_layer(box_width, box_height, xc, yc, beta_c):
+    return numpy.exp(-beta_c*central_place_distance(box_width, box_height, xc, yc))
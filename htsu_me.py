@@ -0,0 +1,114 @@
+###############################################################################
+# Name: htsu_me.py
+#
+# Purpose: Matrix-free propagator for the master equation, Equation (5),
+#
+#            U(s,t+1) = sum over s' of P(s|s') U(s',t),
+#
+#          for the step selection kernel P(s|s') = phi(|s-s'|) w(s) / Z(s'), where
+#          w(s) is the habitat weight and Z(s') = sum over s of phi(|s-s'|) w(s).
+#          Because of this factorisation, one step is "divide by Z, convolve with
+#          phi, multiply by w", so P(s|s') never has to be stored.  Z is itself a
+#          convolution, calculated once.  Memory is O(N) and a step costs O(N log N).
+#
+#          The steady state (stationary UD) of the step selection operator can be
+#          found directly with steady_state, either by power iteration or by a Krylov
+#          (Lanczos) eigen-solver.  The latter uses the fact that
+#          (wZ)^(-1/2) P (wZ)^(1/2) is symmetric, and needs scipy.
+#
+# Usage: from htsu_me import MasterEquation
+#   master_eq = MasterEquation(exp_layer, 0.2)
+#   ud_array = master_eq.step(ud_array)
+#   result = master_eq.steady_state(tolerance=1e-10)
+#   print(result.iterations, result.residual, result.wall_time)
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import time, collections
+import numpy
+import htsu_kernel
+
+# Outcome of MasterEquation.steady_state: the stationary UD, the number of applications
+# of the operator used, the L1 norm of P U - U, the wall time in seconds and whether the
+# tolerance was met
+SteadyState = collections.namedtuple('SteadyState',
+                                     ['ud', 'iterations', 'residual', 'wall_time', 'converged'])
+
+
+class MasterEquation:
+
+    # Set up the propagator for the grid of habitat weights w and step-length parameter
+    # lambda.  The optional tolerance truncates phi as in htsu_kernel.StepKernel.
+    def __init__(self, weights, lambda_val, tolerance=None):
+        self.weights = numpy.asarray(weights, dtype=numpy.float64)
+        box_height, box_width = self.weights.shape
+        self.kernel = htsu_kernel.StepKernel(lambda_val, box_width, box_height, tolerance=tolerance)
+        self.convolver = htsu_kernel.KernelConvolver(self.kernel, box_width, box_height)
+        # Normalising constant Z(s') of P(s|s') for every s' (phi is symmetric, so this is
+        # the convolution of phi with w)
+        self.kernel_sum = numpy.maximum(self.convolver.convolve(self.weights), 1e-300)
+
+    # Advance the utilisation distribution U(s,t) by one step
+    def step(self, ud_array):
+        return self.weights*numpy.maximum(self.convolver.convolve(ud_array/self.kernel_sum), 0)
+
+    # Advance the utilisation distribution by step_no steps
+    def propagate(self, ud_array, step_no):
+        for step in range(step_no):
+            ud_array = self.step(ud_array)
+        return ud_array
+
+    # L1 norm of the change in the UD after one step, which is zero at the steady state
+    def residual(self, ud_array):
+        return numpy.abs(self.step(ud_array) - ud_array).sum()
+
+    # Find the stationary UD, stopping once the L1 norm of P U - U is below tolerance.
+    # method is 'power' (repeated stepping, starting from ud_array or the habitat
+    # weights) or 'krylov' (Lanczos iteration on the symmetrised operator, followed by
+    # power iterations if its answer does not yet meet the tolerance).
+    def steady_state(self, ud_array=None, tolerance=1e-10, max_iterations=100000, method='krylov'):
+        start_time = time.time()
+        if ud_array is None:
+            ud_array = self.weights/self.weights.sum()
+        iterations = 0
+        if method == 'krylov':
+            ud_array, iterations = self._krylov_steady_state(ud_array, tolerance, max_iterations)
+        elif method != 'power':
+            raise ValueError("Unknown steady state method '%s'" % method)
+        ud_array = ud_array/ud_array.sum()
+        next_ud = self.step(ud_array)
+        iterations += 1
+        residual = numpy.abs(next_ud - ud_array).sum()
+        while residual > tolerance and iterations < max_iterations:
+            ud_array = next_ud/next_ud.sum()
+            next_ud = self.step(ud_array)
+            iterations += 1
+            residual = numpy.abs(next_ud - ud_array).sum()
+        return SteadyState(ud_array, iterations, residual, time.time() - start_time,
+                           residual <= tolerance)
+
+    # Leading eigenvector of (wZ)^(-1/2) P (wZ)^(1/2) = w^(1/2) Z^(-1/2) Phi Z^(-1/2) w^(1/2),
+    # which is symmetric, transformed back to an eigenvector of P
+    def _krylov_steady_state(self, ud_array, tolerance, max_iterations):
+        from scipy.sparse.linalg import LinearOperator, eigsh
+        shape = self.weights.shape
+        scale = numpy.sqrt(self.weights/self.kernel_sum)
+        matvec_count = [0]
+
+        def symmetric_step(vector):
+            matvec_count[0] += 1
+            grid = vector.reshape(shape)
+            return (scale*self.convolver.convolve(scale*grid)).ravel()
+
+        operator = LinearOperator((self.weights.size, self.weights.size), matvec=symmetric_step,
+                                  dtype=numpy.float64)
+        # A distribution u maps to u/sqrt(wZ) in the coordinates of the symmetric operator,
+        # the inverse of the transformation of the eigenvector back to P below
+        start = (numpy.maximum(ud_array, 0)/numpy.sqrt(self.weights*self.kernel_sum)).ravel()
+        eigenvalue, eigenvector = eigsh(operator, k=1, which='LA', v0=start+1e-300,
+                                        tol=tolerance*1e-2, maxiter=max_iterations)
+        ud_array = numpy.abs(eigenvector[:,0].reshape(shape))*numpy.sqrt(self.weights*self.kernel_sum)
+        return ud_array, matvec_count[0]
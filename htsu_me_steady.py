@@ -0,0 +1,90 @@
+###############################################################################
+# Name: htsu_me_steady.py
+#
+# Purpose: Steady state of the master equation for an individual moving through a
+#          resource layer, found directly rather than by stepping the master equation
+#          a fixed number of times, and compared with the Barnett-Moorcroft UD
+#
+# Usage: To run this, use the following command
+#   python htsu_me_steady.py random_field_50.inp 1.5 0.2 1e-10 imgtemp.png
+#
+# The first parameter is random_field_50.inp, which gives the resource layer
+# The second parameter (1.5) corresponds to beta_R from Equation (S.2) in Supplementary Appendix A
+# The third parameter (0.2) corresponds to lambda from Equation (S.2) in Supplementary Appendix A
+# The fourth parameter (1e-10) is the tolerance on the L1 norm of the change in the UD over one step
+# The fifth parameter (imgtemp.png) is a file storing a plot of the steady-state UD, over the resource layer
+#   (or none to skip the plot and only calculate)
+# An optional sixth parameter (krylov or power) gives the method used to find the steady state
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys, numpy
+import htsu_layer, htsu_me, htsu_bm, htsu_render
+
+# File containing layer
+curr_arg = 1
+layerfile = sys.argv[curr_arg]
+# beta_r-value (strength of resource effect)
+curr_arg += 1
+beta_r = float(sys.argv[curr_arg])
+# lambda-value (parameter of step length distribution)
+curr_arg += 1
+lambda_val = float(sys.argv[curr_arg])
+# Tolerance on the L1 residual
+curr_arg += 1
+tolerance = float(sys.argv[curr_arg])
+# Get file for saving plot
+curr_arg += 1
+savefile = sys.argv[curr_arg]
+# Method for finding the steady state (optional)
+curr_arg += 1
+method = sys.argv[curr_arg] if len(sys.argv) > curr_arg else 'krylov'
+
+# Get the Z-values corresponding to the resource layer and exp(beta*Z(x))
+z_array = htsu_layer.load_layer(layerfile)
+exp_layer = htsu_layer.exp_layer(z_array, beta_r)
+
+# Box size
+box_width = len(z_array[0])
+box_height = len(z_array)
+
+# Start from the middle of the box, as in htsu_me_ex1.py
+ud_array = numpy.zeros((box_height, box_width))
+ud_array[box_height//2][box_width//2] = 1
+
+# Find the steady state
+master_eq = htsu_me.MasterEquation(exp_layer, lambda_val)
+result = master_eq.steady_state(ud_array, tolerance=tolerance, method=method)
+sys.stdout.write("Method: %s\n" % method)
+sys.stdout.write("Converged: %s\n" % result.converged)
+sys.stdout.write("Iterations: %i\n" % result.iterations)
+sys.stdout.write("L1 residual: %g\n" % result.residual)
+sys.stdout.write("Wall time (s): %g\n" % result.wall_time)
+
+# Compare with the Barnett-Moorcroft UD
+ud_bm = htsu_bm.bm_ud(exp_layer, lambda_val)
+sys.stdout.write("L1 distance from Barnett-Moorcroft UD: %g\n" % numpy.abs(result.ud - ud_bm).sum())
+
+# Plot the results, unless the file for the plot is none (only calculate them)
+if savefile != 'none':
+    # Do the plot
+    plt = htsu_render.pyplot()
+    fig = plt.figure()
+    fig.set_size_inches(7,6)
+    fig.add_subplot(1,1,1)
+    # Plot layer
+    bottomcontour = -4
+    topcontour = 4
+    contourres = 1
+    filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
+    plt.ylabel('Northing',fontsize=20)
+    plt.xlabel('Easting',fontsize=20)
+    # Plot the steady-state utilisation distribution
+    pd_levels = [0.0001,0.0002,0.0005,0.001,0.002,0.005,0.01,0.1]
+    plt.contour(result.ud, origin='lower',colors='k', levels=pd_levels,linewidths=2)
+
+    # Save figure
+    plt.savefig(savefile)
@@ -0,0 +1,180 @@
+###############################################################################
+# Name: htsu_profile.py
+#
+# Purpose: Opt-in timing of the stages of the simulation and analysis scripts (layer
+#          parsing, kernel construction, sampling, UD integration, contouring,
+#          plotting, ...).  Profiling is switched on by setting HTSU_PROFILE to the name
+#          of a JSON file.  For each stage this records the number of times it was
+#          entered, its total wall time, the number of units of work done in it (e.g.
+#          steps) and so the units per second, and the peak memory allocated by Python
+#          while it ran.  The report is written to the JSON file when the script exits.
+#          Stages may be nested; the peak memory of a stage includes that of the stages
+#          inside it.
+#
+#          Peak memory is measured by tracemalloc, which makes code that allocates many
+#          small arrays (such as the step-by-step samplers) several times slower, so the
+#          wall times and steps per second it reports are pessimistic.  Setting
+#          HTSU_PROFILE_MEMORY=0 as well leaves memory out and times the run at full speed.
+#
+#          For long runs, Progress writes a live line to stderr with the steps done so
+#          far and the steps per second.  It is shown when profiling is on, or when
+#          HTSU_PROGRESS is set (to anything but an empty string).
+#
+#          When neither is set, stage and Progress do nothing, so the scripts can call
+#          them unconditionally.
+#
+# Usage: HTSU_PROFILE=profile.json python htsu_fig2.py random_field_100.inp 1.5 0.2 0.2 1000 -4 4 1 fig2.png
+# or, from Python,
+#   import htsu_profile
+#   with htsu_profile.stage('sampling', units=step_no):
+#       ...
+#   htsu_profile.begin('plotting')
+#   ...
+#   htsu_profile.end()
+#   progress = htsu_profile.Progress(step_no)
+#   progress.update()   # once per step
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import os, sys, json, time, atexit, contextlib, tracemalloc
+
+# File the report is written to (profiling is off if this is empty)
+REPORT_FILE = os.environ.get('HTSU_PROFILE', '')
+
+# Whether peak memory is measured
+TRACE_MEMORY = bool(REPORT_FILE) and os.environ.get('HTSU_PROFILE_MEMORY', '1') != '0'
+
+# Whether progress lines are shown
+SHOW_PROGRESS = bool(REPORT_FILE or os.environ.get('HTSU_PROGRESS', ''))
+
+# Shortest time in seconds between updates of the progress line
+PROGRESS_INTERVAL = 1.0
+
+# Totals for each stage, in the order they were first entered
+stages = {}
+
+# Stages currently running, innermost last, each as [name, start time, peak memory so far]
+running = []
+
+# Highest peak memory measured so far, over the whole run
+overall_peak = [0]
+
+start_time = time.perf_counter()
+
+
+# Peak memory traced since the last reset (0 if memory is not measured), resetting it
+def take_peak():
+    if not TRACE_MEMORY:
+        return 0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    return peak
+
+
+class StageTimer:
+
+    def __init__(self, name, units):
+        self.name = name
+        self.units = units
+
+    def __enter__(self):
+        # Keep the peak reached so far by any enclosing stage before resetting it
+        peak = take_peak()
+        if running:
+            running[-1][2] = max(running[-1][2], peak)
+        overall_peak[0] = max(overall_peak[0], peak)
+        running.append([self.name, time.perf_counter(), 0])
+        return self
+
+    def __exit__(self, *exc_info):
+        name, stage_start, peak = running.pop()
+        wall_time = time.perf_counter() - stage_start
+        peak = max(peak, take_peak())
+        if running:
+            running[-1][2] = max(running[-1][2], peak)
+        overall_peak[0] = max(overall_peak[0], peak)
+        totals = stages.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'units': 0,
+                                          'peak_memory': 0 if TRACE_MEMORY else None})
+        totals['calls'] += 1
+        totals['wall_time'] += wall_time
+        totals['units'] += self.units
+        if TRACE_MEMORY:
+            totals['peak_memory'] = max(totals['peak_memory'], peak)
+
+
+# Time the block inside "with stage(name, units):" as the stage name, with units units of
+# work (e.g. steps) done in it
+def stage(name, units=0):
+    if not REPORT_FILE:
+        return contextlib.nullcontext()
+    return StageTimer(name, units)
+
+
+# Stages started by begin and not yet ended, innermost last
+open_stages = []
+
+
+# Start and end a stage without a with block, for long stretches of a script such as
+# plotting: begin(name, units) ... end()
+def begin(name, units=0):
+    timer = stage(name, units)
+    timer.__enter__()
+    open_stages.append(timer)
+
+
+def end():
+    open_stages.pop().__exit__(None, None, None)
+
+
+# The report: each stage's totals, with units per second, and the whole run's wall time
+def report():
+    stage_reports = {}
+    for name, totals in stages.items():
+        stage_reports[name] = dict(totals)
+        if totals['units'] and totals['wall_time'] > 0:
+            stage_reports[name]['units_per_second'] = totals['units']/totals['wall_time']
+    return {'argv': sys.argv,
+            'wall_time': time.perf_counter() - start_time,
+            'peak_memory': max(overall_peak[0], take_peak()) if TRACE_MEMORY else None,
+            'stages': stage_reports}
+
+
+def write_report():
+    outfile = open(REPORT_FILE, 'w')
+    json.dump(report(), outfile, indent=1)
+    outfile.close()
+
+
+class Progress:
+
+    # Live progress line for total steps (label is what is being counted)
+    def __init__(self, total, label='steps'):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.start_time = time.perf_counter()
+        self.last_shown = self.start_time
+
+    # Count steps more steps as done, showing the line at most every PROGRESS_INTERVAL
+    # seconds and when the last step is done
+    def update(self, steps=1):
+        if not SHOW_PROGRESS:
+            return
+        self.done += steps
+        now = time.perf_counter()
+        if now - self.last_shown >= PROGRESS_INTERVAL or self.done >= self.total:
+            self.last_shown = now
+            rate = self.done/max(now - self.start_time, 1e-9)
+            sys.stderr.write("\r%i/%i %s (%.4g %s/s)" % (self.done, self.total, self.label, rate, self.label))
+            if self.done >= self.total:
+                sys.stderr.write("\n")
+            sys.stderr.flush()
+
+
+if TRACE_MEMORY:
+    tracemalloc.start()
+if REPORT_FILE:
+    atexit.register(write_report)
@@ -0,0 +1,145 @@
+###############################################################################
+# Name: htsu_render.py
+#
+# Purpose: Rendering stage shared by the scripts, kept apart from the calculations so
+#          that runs which only compute never import matplotlib.  pyplot() imports it on
+#          first use, on the non-interactive Agg backend (unless MPLBACKEND chooses
+#          another), so nothing waits on a display.
+#
+#          The resource layer drawn under every panel of a figure is contoured once:
+#          LayerContours runs contourf on the first panel and adds the same filled
+#          contour paths to the others.  Scatters of many points (e.g. 20000-step
+#          tracks) are rasterised, so that vector output stays small and quick to draw.
+#
+#          Run as a script, it renders any number of result files over one layer, one
+#          image per file, drawing the layer once and swapping only what is on top:
+#          trajectory files (text or binary, see htsu_traj.py) are drawn as points, one
+#          colour per individual, and .npy grids (UDs or KDEs, or a stack of them) as
+#          contours.
+#
+# Usage: To run this, use the following command
+#   python htsu_render.py random_field_100.inp outdir temp.out htsu_sim_4paths_full.out ud.npy
+# which writes outdir/temp.png, outdir/htsu_sim_4paths_full.png and outdir/ud.png, or, from Python,
+#   import htsu_render
+#   plt = htsu_render.pyplot()
+#   layer_contours = htsu_render.LayerContours(z_array, htsu_render.layer_levels(-4, 4, 1), extent)
+#   layer_contours.draw(plt.gca())
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import os, sys
+import numpy
+import htsu_layer, htsu_traj
+
+# Number of points above which a scatter is rasterised
+RASTERIZE_POINTS = 1000
+
+# Colours of the individuals in a trajectory file, and the UD levels contoured
+INDIV_COLORS = ['k','r','b','m']
+PD_LEVELS = [0.0001,0.0002,0.0005,0.001,0.002,0.005,0.01,0.1]
+
+
+# matplotlib.pyplot, imported on first use, on the Agg backend unless MPLBACKEND is set
+def pyplot():
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        if 'MPLBACKEND' not in os.environ:
+            matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    return plt
+
+
+# Contour levels of the resource layer, as in the scripts: bottomcontour/contourres,
+# ..., (topcontour-1)/contourres
+def layer_levels(bottomcontour, topcontour, contourres):
+    return [float(x)/contourres for x in range(bottomcontour,topcontour)]
+
+
+class LayerContours:
+
+    # Filled contours of the layer z_array (cmap Greens, with origin='lower') at levels,
+    # covering extent = [left, right, bottom, top]
+    def __init__(self, z_array, levels, extent, cmap='Greens'):
+        self.z_array = z_array
+        self.levels = levels
+        self.extent = extent
+        self.cmap = cmap
+        self.paths = None
+
+    # Draw the contours on axes, returning the contour set (on the first call, for
+    # colorbars) or the collection holding the same paths (on later calls)
+    def draw(self, axes):
+        if self.paths is None:
+            contour_set = axes.contourf(self.z_array, origin='lower', extent=self.extent, levels=self.levels,
+                                        cmap=self.cmap)
+            self.paths = contour_set.get_paths()
+            self.facecolors = contour_set.get_facecolor()
+            return contour_set
+        from matplotlib.collections import PathCollection
+        collection = PathCollection(self.paths, facecolors=self.facecolors, edgecolors='none', linewidths=0)
+        # As contourf does, keep autoscaling from adding margins around the layer
+        collection.sticky_edges.x[:] = [self.extent[0], self.extent[1]]
+        collection.sticky_edges.y[:] = [self.extent[2], self.extent[3]]
+        axes.add_collection(collection)
+        axes.autoscale_view()
+        return collection
+
+
+# Scatter x_vals against y_vals on axes (or pyplot), rasterised if there are many points
+def scatter(axes, x_vals, y_vals, **kwargs):
+    kwargs.setdefault('rasterized', numpy.size(x_vals) > RASTERIZE_POINTS)
+    return axes.scatter(x_vals, y_vals, **kwargs)
+
+
+# Draw the contents of a result file on axes, returning the artists added: the points
+# of each individual of a trajectory file, or the contours of each grid in a .npy file
+def draw_result(axes, filename, extent):
+    artists = []
+    if filename.endswith('.npy'):
+        grids = numpy.load(filename)
+        if grids.ndim == 2:
+            grids = grids[numpy.newaxis]
+        for grid_no, grid in enumerate(grids):
+            contour_set = axes.contour(grid/grid.sum(), origin='lower', colors=INDIV_COLORS[grid_no%len(INDIV_COLORS)],
+                                       levels=PD_LEVELS, extent=extent, linewidths=2)
+            artists += [contour_set]
+    else:
+        for indiv, (x_array, y_array) in enumerate(htsu_traj.read_file_positions(filename)):
+            color = INDIV_COLORS[indiv%len(INDIV_COLORS)]
+            artists += [scatter(axes, x_array, y_array, s=3, c=color, marker='o', edgecolors=color)]
+    return artists
+
+
+# Render each result file over the layer to outdir, one image per file (named after the
+# file, with the extension image_ext), in one figure with the layer contoured once
+def render_results(layerfile, outdir, filenames, image_ext='.png'):
+    plt = pyplot()
+    z_array = htsu_layer.load_layer(layerfile)
+    box_height, box_width = numpy.shape(z_array)
+    extent = [0,box_width-1,0,box_height-1]
+    fig = plt.figure()
+    fig.set_size_inches(7,6)
+    axes = fig.add_subplot(1,1,1)
+    layer_contours = LayerContours(z_array, layer_levels(-4, 4, 1), extent)
+    fig.colorbar(layer_contours.draw(axes))
+    axes.set_ylabel('Northing',fontsize=20)
+    axes.set_xlabel('Easting',fontsize=20)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    savefiles = []
+    for filename in filenames:
+        artists = draw_result(axes, filename, extent)
+        savefiles += [os.path.join(outdir, os.path.splitext(os.path.basename(filename))[0] + image_ext)]
+        fig.savefig(savefiles[-1])
+        for artist in artists:
+            artist.remove()
+    plt.close(fig)
+    return savefiles
+
+
+if __name__ == '__main__':
+    for savefile in render_results(sys.argv[1], sys.argv[2], sys.argv[3:]):
+        sys.stderr.write("Wrote %s\n" % savefile)
@@ -0,0 +1,118 @@
+###############################################################################
+# Name: htsu_sample.py
+#
+# Purpose: Draw the next location of a simulated animal from a grid of (unnormalised)
+#          movement kernel weights.  A single draw takes a flat cumulative sum of the
+#          weights and a binary search for the random number, so no normalisation
+#          pass is needed.  For a grid of weights that is sampled from many times, an
+#          AliasTable gives draws in constant time.
+#
+# Usage: from htsu_sample import draw_cell, AliasTable
+#   y_val, x_val = draw_cell(weights, random.random())
+#   table = AliasTable(weights)
+#   y_val, x_val = table.draw_cell(random.random())
+#   columns = draw_indices(row_weights, rng.random(len(row_weights)))
+#   columns, leftovers = draw_indices(row_weights, rng.random(len(row_weights)), leftover=True)
+#   rows, cols = draw_cells(stacked_weights, rng.random(len(stacked_weights)))
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import numpy
+
+
+# Find the flat index (in row-major order) of the cell picked out by random_no, a
+# number drawn uniformly from [0,1), from an unnormalised grid of weights.  This is
+# the first cell whose cumulative weight exceeds random_no times the total weight.
+def draw_index(weights, random_no):
+    cum_dist = numpy.cumsum(weights, dtype=numpy.float64)
+    index = int(numpy.searchsorted(cum_dist, random_no*cum_dist[-1], side='right'))
+    # Guard against rounding when random_no*total is within an ulp of the total
+    return min(index, cum_dist.size - 1)
+
+
+# As draw_index, but return the (y,x) position of the cell in a 2D grid of weights
+def draw_cell(weights, random_no):
+    return divmod(draw_index(weights, random_no), numpy.shape(weights)[1])
+
+
+class AliasTable:
+
+    # Build the alias table (Vose's method) for an unnormalised grid of weights.  This
+    # costs O(N) once, after which each draw costs O(1).
+    def __init__(self, weights):
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        self.shape = weights.shape
+        no_cells = weights.size
+        scaled = weights.ravel()*(no_cells/weights.sum())
+        self.prob = numpy.ones(no_cells)
+        self.alias = numpy.arange(no_cells)
+        small = list(numpy.flatnonzero(scaled < 1))
+        large = list(numpy.flatnonzero(scaled >= 1))
+        while small and large:
+            small_cell = small.pop()
+            large_cell = large[-1]
+            self.prob[small_cell] = scaled[small_cell]
+            self.alias[small_cell] = large_cell
+            # Give the remainder of the small cell's column to the large cell
+            scaled[large_cell] -= 1 - scaled[small_cell]
+            if scaled[large_cell] < 1:
+                small.append(large.pop())
+        # Anything left over is, up to rounding, exactly 1 and keeps prob = 1
+
+    # Flat index of the cell picked out by random_no (uniform on [0,1)).  The integer
+    # part of random_no*N picks a column of the table and the fractional part decides
+    # between that column's cell and its alias.  random_no may also be an array.
+    def draw_index(self, random_no):
+        scaled = numpy.asarray(random_no)*self.prob.size
+        column = numpy.minimum(scaled.astype(numpy.int64), self.prob.size - 1)
+        index = numpy.where(scaled - column < self.prob[column], column, self.alias[column])
+        return index if index.ndim else int(index)
+
+    # As draw_index, but return the (y,x) position of the cell
+    def draw_cell(self, random_no):
+        return divmod(self.draw_index(random_no), self.shape[1])
+
+
+# Draw one column from each row of a 2D array of unnormalised weights, using one random
+# number (uniform on [0,1)) per row.  Used to move many walkers at once.  Each row's
+# cumulative sum is scaled to [0,1] and shifted by the row number, so that all the rows
+# form one sorted array and a single binary search finds every column.  With
+# leftover=True, the part of each random number not used up by the draw is returned too,
+# as a fraction of the chosen weight (uniform on [0,1) and independent of the draw), so
+# that it can be reused for a second draw.  Raises ValueError if the weights of any row
+# sum to zero, as there is then nothing to draw from.
+def draw_indices(weights, random_nos, leftover=False):
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+    no_rows, no_cols = weights.shape
+    row_nos = numpy.arange(no_rows)
+    cum_dist = numpy.cumsum(weights, axis=1)
+    totals = cum_dist[:,-1].copy()
+    if not (totals > 0).all():
+        raise ValueError("Weights of row %i sum to zero, so no index can be drawn from it"
+                         % numpy.flatnonzero(~(totals > 0))[0])
+    cum_dist /= totals[:,numpy.newaxis]
+    cum_dist += row_nos[:,numpy.newaxis]
+    targets = row_nos + numpy.asarray(random_nos)
+    indices = numpy.searchsorted(cum_dist.ravel(), targets, side='right') - row_nos*no_cols
+    # Guard against rounding when the random number is within an ulp of 1
+    indices = numpy.minimum(indices, no_cols - 1)
+    if not leftover:
+        return indices
+    chosen = weights[row_nos,indices]/totals
+    before = cum_dist[row_nos,indices] - row_nos - chosen
+    fractions = numpy.clip((targets - row_nos - before)/numpy.where(chosen > 0, chosen, 1), 0, 1)
+    return indices, fractions
+
+
+# Draw one cell from each of a stack of 2D weight grids, weights[walker][y][x], using
+# one random number per grid.  The row is drawn from the row totals first and then the
+# column within that row, reusing the part of the random number left over from the row
+# draw.  This picks the same cell as draw_cell on each grid (up to rounding), but only
+# takes cumulative sums over the row totals and one row per grid.
+def draw_cells(weights, random_nos):
+    rows, fractions = draw_indices(weights.sum(axis=2), random_nos, leftover=True)
+    cols = draw_indices(weights[numpy.arange(len(weights)),rows], fractions)
+    return rows, cols
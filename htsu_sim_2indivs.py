@@ -1,17 +1,22 @@
 ###############################################################################
 # Name: htsu_sim_2indivs.py
 #
-# Purpose: Simulate 2 interacting individuals moving through a resource layer with mutual avoidance
+# Purpose: Simulate interacting individuals (2 by default) moving through a resource layer with mutual avoidance
 #
 # Usage: python htsu_sim_2indivs.py random_field_100.inp 0.5 1000 20000 15000 10000 imgtemp.png > htsu_sim_2indivs.out
+#   An optional eighth parameter gives the number of individuals (default 2), and an optional ninth
+#   parameter a .npy file for saving the KDE of each individual's positions after burn in (or none).
+#   An optional tenth parameter gives a binary file (see htsu_traj.py) for storing the locations after
+#   burn in, instead of writing them to stdout (or none).  Giving none as the plot file (imgtemp.png) skips
+#   the plot, so that matplotlib is not imported.
 ###############################################################################
 
-import sys, math, random
-from matplotlib import pyplot as plt
+import sys, numpy
+import htsu_layer, htsu_interact, htsu_kde, htsu_traj, htsu_profile, htsu_render
 
 # File containing layer
 curr_arg = 1
-infile = open(sys.argv[curr_arg],'r')
+layerfile = sys.argv[curr_arg]
 # beta_r-value (strength of resource effect)
 curr_arg += 1
 beta_r = float(sys.argv[curr_arg])
@@ -31,166 +36,81 @@ no_steps_for_od = int(sys.argv[curr_arg])
 curr_arg += 1
 savefile = sys.argv[curr_arg]
 
-# Amount to decrease OD by each step
-dec_inc = 1/float(no_steps_for_od)
-
-# Start the random number generator
-random.seed()
+# Number of individuals (optional)
+curr_arg += 1
+no_indivs = int(sys.argv[curr_arg]) if len(sys.argv) > curr_arg else 2
+# File for saving the KDEs of the individuals' positions after burn in (optional)
+curr_arg += 1
+kdefile = sys.argv[curr_arg] if len(sys.argv) > curr_arg and sys.argv[curr_arg] != 'none' else None
+# Binary trajectory file for the locations after burn in (optional; by default they are written
+# to stdout as text)
+curr_arg += 1
+trajfile = sys.argv[curr_arg] if len(sys.argv) > curr_arg and sys.argv[curr_arg] != 'none' else None
 
 # Get the R-values and also exp(beta_R*R(x))
-r_array = [[]]
-exp_layer = [[]]
-infile.seek(0)
-y_val = -1
-for line in infile:
-    y_val += 1
-    if y_val != 0:
-        r_array += [[]]
-        exp_layer += [[]]
-    split_line = line.rsplit()
-    for x_val in range(len(split_line)):
-        r_array[y_val] += [float(split_line[x_val])]
-        exp_layer[y_val] += [math.exp(beta_r*r_array[y_val][x_val])]
-infile.close()
+with htsu_profile.stage('load_layer'):
+  r_array = htsu_layer.load_layer(layerfile)
+  exp_layer = htsu_layer.exp_layer(r_array, beta_r)
 
 # Box size
 box_width = len(r_array[0])
 box_height = len(r_array)
 
-# Set up array to store occurrence distributions
-no_indivs = 2
-occurrence_dist = [[[]]]
-for individual in range(no_indivs):
-  if individual != 0:
-    occurrence_dist += [[[]]]
-  # Loop through space
-  for spacey in range(box_height):
-    if spacey != 0:
-      occurrence_dist[individual] += [[]]
-    for spacex in range(box_width):
-      occurrence_dist[individual][spacey] += [0]  
+# Start locations: spaced evenly along the middle row (for 2 individuals, in the centre of
+# the left- and right-hand halves of the domain)
+seed = int(numpy.random.SeedSequence().generate_state(1)[0])
+walkers = htsu_interact.InteractingWalkers(exp_layer, no_indivs, beta_avoid, no_steps_for_od, seed=seed)
 
-# Start locations: in the centre of the left- and right-hand halves of the domain
-loc_x = [[]]
-loc_y = [[]]
-xc = [box_width/4,3*box_width/4]
-yc = [box_height/2,box_height/2]
-for indiv in range(no_indivs):
-  if indiv != 0:
-    loc_x += [[]]
-    loc_y += [[]]
-  loc_x[indiv] += [xc[indiv]]
-  loc_y[indiv] += [yc[indiv]]
-  occurrence_dist[indiv][yc[indiv]][xc[indiv]] = 1
+# KDEs of the positions after burn in, built up as the paths are simulated
+accumulators = [htsu_kde.KDEAccumulator(box_width, box_height, start_val=burn_in) for indiv in range(no_indivs)]
 
-# Simulate paths
-for step in range(1,step_no):
-  for indiv in range(no_indivs):
-    # Draw a random number
-    random_no = random.random()
-    # Calculate the probabilities of moving up/down/left/right
-    if loc_y[indiv][step-1] == 0:
-      # Can't move up if at the top of the domain
-      up_prob = 0
-    else:
-      # Include the effect of the resource layer
-      up_prob = exp_layer[loc_y[indiv][step-1]-1][loc_x[indiv][step-1]]
-      # Include the effect of the occurrence distribution of the other individual
-      for indiv2 in range(no_indivs):
-        if indiv2 != indiv:
-          up_prob *= math.exp(-beta_avoid*occurrence_dist[indiv2][loc_y[indiv][step-1]-1][loc_x[indiv][step-1]])
-    if loc_y[indiv][step-1] == box_height - 1:
-      # Can't move down if at the bottom of the domain
-      down_prob = 0
-    else:
-      # Include the effect of the resource layer
-      down_prob = exp_layer[loc_y[indiv][step-1]+1][loc_x[indiv][step-1]]
-      # Include the effect of the occurrence distribution of the other individual
-      for indiv2 in range(no_indivs):
-        if indiv2 != indiv:
-          down_prob *= math.exp(-beta_avoid*occurrence_dist[indiv2][loc_y[indiv][step-1]+1][loc_x[indiv][step-1]])
-    if loc_x[indiv][step-1] == 0:
-      # Can't move left if at the far left of the domain
-      left_prob = 0
-    else:
-      # Include the effect of the resource layer
-      left_prob = exp_layer[loc_y[indiv][step-1]][loc_x[indiv][step-1]-1]
-      # Include the effect of the occurrence distribution of the other individual
-      for indiv2 in range(no_indivs):
-        if indiv2 != indiv:
-          left_prob *= math.exp(-beta_avoid*occurrence_dist[indiv2][loc_y[indiv][step-1]][loc_x[indiv][step-1]-1])
-    if loc_x[indiv][step-1] == box_width - 1:
-      # Can't move right if at the far right of the domain
-      right_prob = 0
-    else:
-      # Include the effect of the resource layer
-      right_prob = exp_layer[loc_y[indiv][step-1]][loc_x[indiv][step-1]+1]
-      # Include the effect of the occurrence distribution of the other individual
-      for indiv2 in range(no_indivs):
-        if indiv2 != indiv:
-          right_prob *= math.exp(-beta_avoid*occurrence_dist[indiv2][loc_y[indiv][step-1]][loc_x[indiv][step-1]+1])
-    tot_prob = up_prob + down_prob + left_prob + right_prob
-    # Normalise probabilities 
-    up_prob /= tot_prob
-    down_prob /= tot_prob
-    left_prob /= tot_prob
-    right_prob /= tot_prob
+# Simulate paths, starting with the start locations
+with htsu_profile.stage('sampling', units=(step_no-1)*no_indivs):
+  locations = numpy.concatenate(([numpy.transpose([walkers.loc_x, walkers.loc_y])],
+                                 walkers.run(step_no-1, accumulators=accumulators,
+                                             progress=htsu_profile.Progress(step_no-1))))
+if kdefile is not None:
+  with htsu_profile.stage('kde'):
+    numpy.save(kdefile, numpy.array([accumulator.density() for accumulator in accumulators]))
 
-    # Move individual
-    if random_no < up_prob:
-      # Move on up
-      loc_x[indiv] += [loc_x[indiv][step-1]]
-      loc_y[indiv] += [loc_y[indiv][step-1]-1]
-    elif random_no < up_prob + down_prob:
-      # Get down
-      loc_x[indiv] += [loc_x[indiv][step-1]]
-      loc_y[indiv] += [loc_y[indiv][step-1]+1]
-    elif random_no < up_prob + down_prob + left_prob:
-      # Go left
-      loc_x[indiv] += [loc_x[indiv][step-1]-1]
-      loc_y[indiv] += [loc_y[indiv][step-1]]
-    else:
-      # To the right
-      loc_x[indiv] += [loc_x[indiv][step-1]+1]
-      loc_y[indiv] += [loc_y[indiv][step-1]]
+# Write locations to file, from the step after burn in
+columns = htsu_traj.position_columns(no_indivs)
+if trajfile is None:
+  writer = htsu_traj.TextTrajectoryWriter(sys.stdout, columns, start_val=burn_in)
+else:
+  writer = htsu_traj.TrajectoryWriter(trajfile, columns, no_indivs=no_indivs, start_val=burn_in,
+                                      metadata={'script': 'htsu_sim_2indivs.py', 'layerfile': layerfile,
+                                                'beta_r': beta_r, 'beta_avoid': beta_avoid, 'step_no': step_no,
+                                                'burn_in': burn_in, 'no_steps_for_od': no_steps_for_od,
+                                                'seed': seed})
+with htsu_profile.stage('write_locations', units=step_no-1):
+  writer.write_rows(locations[1:].reshape((step_no-1, 2*no_indivs)))
+  writer.close()
 
-    # Write locations to file
-    if step > burn_in:
-      if indiv == no_indivs - 1:
-        sys.stdout.write("%i\t%i\n" % (loc_x[indiv][step], loc_y[indiv][step]))
-      else:
-        sys.stdout.write("%i\t%i\t" % (loc_x[indiv][step], loc_y[indiv][step]))
-   
-  # Update occurrence distributions 
-  for indiv in range(no_indivs):
-    if step < no_steps_for_od:
-      # We are within the first no_steps_for_od steps, so decrease the OD at the first step
-      occurrence_dist[indiv][loc_y[indiv][0]][loc_x[indiv][0]] -= dec_inc
-    else: 
-      # Deprecate the occurrence distribution at the first position used to calculate this distribution
-      occurrence_dist[indiv][loc_y[indiv][step - no_steps_for_od]][loc_x[indiv][step - no_steps_for_od]] -= dec_inc
-    # Increment the occurrence distribution at the current position
-    occurrence_dist[indiv][loc_y[indiv][step]][loc_x[indiv][step]] += dec_inc
-
-# Add random jitter to account for the fact that locations may be at any point within a pixel
-for indiv in range(no_indivs):
-  for point in range(step_no):
-    loc_x[indiv][point] += random.random()-0.5
-    loc_y[indiv][point] += random.random()-0.5
+# Add random jitter to account for the fact that locations may be at any point within a pixel,
+# drawn from the walkers' generator so that it is reproduced from the seed as well
+loc_x = locations[:,:,0].T + walkers.rng.random((no_indivs, step_no)) - 0.5
+loc_y = locations[:,:,1].T + walkers.rng.random((no_indivs, step_no)) - 0.5
     
-# Plot resource layer with locations on top
-fig = plt.figure()
-fig.set_size_inches(6,6)
-fig.add_subplot(1,1,1)
-plt.hold('on')
-bottomcontour = -4
-topcontour = 4
-contourres = 1
-filled_contours = plt.contourf(r_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
-colors = ['k','r','b','m']
-for indiv in range(no_indivs):
-  plt.scatter(loc_x[indiv],loc_y[indiv],s=3, c=colors[indiv], marker='o', edgecolors=colors[indiv])
+# Plot the results, unless the file for the plot is none (only calculate them)
+if savefile != 'none':
+  # Plot resource layer with locations on top
+  with htsu_profile.stage('import_matplotlib'):
+    plt = htsu_render.pyplot()
+  htsu_profile.begin('plotting')
+  fig = plt.figure()
+  fig.set_size_inches(6,6)
+  fig.add_subplot(1,1,1)
+  bottomcontour = -4
+  topcontour = 4
+  contourres = 1
+  filled_contours = plt.contourf(r_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
+  colors = ['k','r','b','m']
+  for indiv in range(no_indivs):
+    htsu_render.scatter(plt, loc_x[indiv],loc_y[indiv],s=3, c=colors[indiv%len(colors)], marker='o', edgecolors=colors[indiv%len(colors)])
   
-# Save and show figure
-plt.savefig(savefile)
-plt.show()
\ No newline at end of file
+  htsu_profile.end()
+
+  # Save figure
+  with htsu_profile.stage('savefig'):
+    plt.savefig(savefile)
\ No newline at end of file
@@ -5,25 +5,34 @@
 #
 # Usage: To run this, use the following command
 #   python htsu_sim_path_ex1.py random_field_100.inp 1.5 0.2 100 imgtemp.png > temp.out
+# or, truncating the step-length kernel where it discards at most 1e-6 of its mass,
+#   python htsu_sim_path_ex1.py random_field_100.inp 1.5 0.2 100 imgtemp.png 1e-6 > temp.out
 #
-# The first parameter is random_field_100.inp, which gives the resource layer
+# The first parameter is random_field_100.inp, which gives the resource layer, or a directory of tiles
+# written by htsu_tiles.py for a layer too large to hold in memory (the step-length kernel is then
+# truncated at the tolerance htsu_tiles.KERNEL_TOLERANCE unless one is given)
 # The second parameter (1.5) corresponds to beta_1 from Equation (2) in Supplementary Appendix A
 # The third parameter (0.2) corresponds to lambda from Equation (2) in Supplementary Appendix A
 # The fourth parameter (100) is the number of steps to be simulated
 # The fifth parameter (imgtemp.png) is a file storing a plot of the simulated locations, over the resource layer
-# The sixth parameter (temp.out) is a file storing the locations of the simulated animal
+#   (or none to skip the plot and only calculate)
+# The optional sixth parameter (1e-6) is the tolerance on the mass of the step-length kernel that
+# may be discarded by truncating it.  The default (or none) is to evaluate it over the whole landscape.
+# The optional seventh parameter (e.g. temp.traj) is a binary file (see htsu_traj.py) for storing the
+# locations, instead of writing them to stdout (or none)
+# The output (temp.out) is a file storing the locations of the simulated animal
 # 
 # Author: Jonathan R. Potts
 #
 # Feel free to share and adapt, but giving appropriate credit
 ###############################################################################
 
-import sys, math, random
-from matplotlib import pyplot as plt
+import os, sys, random
+import htsu_layer, htsu_tiles, htsu_kernel, htsu_walk, htsu_traj, htsu_render
 
 # File containing layer
 curr_arg = 1
-infile = open(sys.argv[curr_arg],'r')
+layerfile = sys.argv[curr_arg]
 # beta_r-value (strength of resource effect)
 curr_arg += 1
 beta_r = float(sys.argv[curr_arg])
@@ -36,89 +45,75 @@ step_no = int(sys.argv[curr_arg])
 # Get file for saving plot
 curr_arg += 1
 savefile = sys.argv[curr_arg]
+# Tolerance on the mass of the step-length kernel discarded by truncating it (optional)
+curr_arg += 1
+tolerance = float(sys.argv[curr_arg]) if len(sys.argv) > curr_arg and sys.argv[curr_arg] != 'none' else None
+# Binary trajectory file for the locations (optional; by default they are written to stdout as text)
+curr_arg += 1
+trajfile = sys.argv[curr_arg] if len(sys.argv) > curr_arg and sys.argv[curr_arg] != 'none' else None
 
-# Start the random number generator
-random.seed()
+# Start the random number generator, keeping the seed so that it can be stored with the locations
+seed = random.SystemRandom().randrange(2**32)
+random.seed(seed)
 
-# Get the Z-values corresponding to the resource layer, and also exp(beta*Z(x)) 
-z_array = [[]]
-exp_layer = [[]]
-infile.seek(0)
-y_val = -1
-for line in infile:
-    y_val += 1
-    if y_val != 0:
-        z_array += [[]]
-        exp_layer += [[]]
-    split_line = line.rsplit()
-    for x_val in range(len(split_line)):
-        z_array[y_val] += [float(split_line[x_val])]
-        exp_layer[y_val] += [math.exp(beta_r*z_array[y_val][x_val])]
-infile.close()
+# Get the Z-values corresponding to the resource layer, and also exp(beta*Z(x)).  A directory
+# of tiles (see htsu_tiles.py) is read a tile at a time as the animal reaches it, and only an
+# overview of it is plotted.
+if os.path.isdir(layerfile):
+    exp_layer = htsu_tiles.TiledLayer(layerfile, beta=beta_r)
+    if tolerance is None:
+        tolerance = htsu_tiles.KERNEL_TOLERANCE
+    if savefile != 'none':
+        z_array = htsu_tiles.TiledLayer(layerfile).overview(htsu_tiles.overview_step(exp_layer.shape))
+else:
+    z_array = htsu_layer.load_layer(layerfile)
+    exp_layer = htsu_layer.exp_layer(z_array, beta_r)
 
 # Box size
-box_width = len(z_array[0])
-box_height = len(z_array)
+box_height, box_width = exp_layer.shape
 
 # Central point
-xc = box_width/2
-yc = box_height/2
+xc = box_width//2
+yc = box_height//2
+
+# Tabulate the step-length term of the movement kernel, exp(-lambda*|x-z|), for every offset
+kernel = htsu_kernel.StepKernel(lambda_val, box_width, box_height, tolerance=tolerance)
+if tolerance is not None:
+    sys.stderr.write("Step-length kernel truncated at radius %i: discarded tail mass %g\n" %
+                     (kernel.radius, kernel.tail_mass))
 
-# Start location
-loc_x = [xc]
-loc_y = [yc]
+# Where the locations are written
+if trajfile is None:
+    writer = htsu_traj.TextTrajectoryWriter(sys.stdout, ['x', 'y'])
+else:
+    writer = htsu_traj.TrajectoryWriter(trajfile, ['x', 'y'], no_indivs=1,
+                                        metadata={'script': 'htsu_sim_path_ex1.py', 'layerfile': layerfile,
+                                                  'beta_r': beta_r, 'lambda': lambda_val, 'step_no': step_no,
+                                                  'tolerance': tolerance, 'seed': seed})
 
-# Find locations
-for step in range(1,step_no):
-    # Draw a random number
-    random_no = random.random()
-    # Calculate the cumulative probability distribution for the movement kernel
-    cum_dist = [[]]
-    cum_val = 0
-    for y_val in range(len(exp_layer)):
-        if y_val != 0:
-            cum_dist += [[]]
-        for x_val in range(len(exp_layer[y_val])):
-            cum_val += (math.exp(-lambda_val*math.sqrt((float(x_val-loc_x[step-1]))**2+(float(y_val-loc_y[step-1]))**2))*
-                        exp_layer[y_val][x_val])
-            cum_dist[y_val] += [cum_val]
-    # Normalise probabilities 
-    for y_val in range(len(cum_dist)):
-        for x_val in range(len(cum_dist[y_val])):
-            cum_dist[y_val][x_val] /= cum_val
-    
-    # Flag that we have not yet found the location given by the random draw
-    found = 0
-    # Find the x- and y-values corresponding to this random draw
-    for y_val in range(len(cum_dist)):
-        for x_val in range(len(cum_dist[y_val])):
-            if cum_dist[y_val][x_val] > random_no:
-                loc_x += [x_val]
-                loc_y += [y_val]
-                sys.stdout.write("%i\t%i\n" % (x_val, y_val))
-                # Flag that we have found the location
-                found = 1
-                break
-        if found == 1:
-            break
+# Find locations, writing each as it is found
+loc_x, loc_y = htsu_walk.simulate_path(exp_layer, kernel, step_no, (xc, yc),
+                                       visit=lambda x, y: writer.write_row((x, y)))
+writer.close()
 
-# Plot resource layer and locations
-fig = plt.figure()
-fig.set_size_inches(7,6)
-fig.add_subplot(1,1,1)
-plt.hold('on')
-# Plot layer
-bottomcontour = -4
-topcontour = 4
-contourres = 1
-filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
-plt.ylabel('Northing',fontsize=20)
-plt.xlabel('Easting',fontsize=20)
-# Make a colorbar 
-cbar = plt.colorbar(filled_contours)
-# Plot locations as black dots
-plt.scatter(loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
+# Plot the results, unless the file for the plot is none (only calculate them)
+if savefile != 'none':
+    # Plot resource layer and locations
+    plt = htsu_render.pyplot()
+    fig = plt.figure()
+    fig.set_size_inches(7,6)
+    fig.add_subplot(1,1,1)
+    # Plot layer
+    bottomcontour = -4
+    topcontour = 4
+    contourres = 1
+    filled_contours = plt.contourf(z_array, origin='lower', extent=[0,box_width-1,0,box_height-1], levels=[float(x)/contourres for x in range(bottomcontour,topcontour)],cmap=plt.cm.Greens)
+    plt.ylabel('Northing',fontsize=20)
+    plt.xlabel('Easting',fontsize=20)
+    # Make a colorbar 
+    cbar = plt.colorbar(filled_contours)
+    # Plot locations as black dots
+    htsu_render.scatter(plt, loc_x, loc_y, s=3, c='k', marker='o', edgecolors=None)
 
-# Save figure
-plt.savefig(savefile)
-plt.show()
\ No newline at end of file
+    # Save figure
+    plt.savefig(savefile)
\ No newline at end of file
@@ -0,0 +1,145 @@
+###############################################################################
+# Name: htsu_ssf.py
+#
+# Purpose: Step selection analysis in Python, in place of survival::clogit in
+#          htsu_bm_from_ssa.R.  The conditional logistic likelihood
+#
+#            L(beta) = product over strata s of
+#                        exp(sum of beta.x over the observed steps in s) /
+#                        (sum of exp(beta.x) over all the steps in s)^(d_s),
+#
+#          where d_s is the number of observed steps in stratum s (1 for step
+#          selection data, when this is the exact likelihood; otherwise it is
+#          Breslow's approximation), is maximised by Newton-Raphson.  Each iteration
+#          works on all the strata at once: the rows are sorted by stratum once, and
+#          the per-stratum log-sum-exp, weighted means and covariances are found with
+#          numpy.maximum.reduceat and numpy.add.reduceat, so the cost is O(n k^2) for n
+#          rows and k covariates with no loop over strata.
+#
+#          The step-length parameter of the movement kernel is then found with the
+#          correction of Forester et al. (2009), as in htsu_bm_from_ssa.R:
+#
+#            lambda = 1/(mean observed step length) - (coefficient of step length).
+#
+# Usage: To run this, use the following command
+#   python htsu_ssf.py sim_ssf_rf1_beta1_1.csv
+# or, from Python,
+#   from htsu_ssf import read_ssf_table, fit_step_selection
+#   beta, lambda_val, fit = fit_step_selection(read_ssf_table('sim_ssf_rf1_beta1_1.csv'))
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys, collections
+import numpy
+
+# Outcome of clogit: the coefficients and their standard errors (in the order of the
+# covariates), the maximised log-likelihood, the number of Newton-Raphson iterations and
+# whether they converged
+ClogitFit = collections.namedtuple('ClogitFit',
+                                   ['coefficients', 'std_errors', 'loglik', 'iterations', 'converged'])
+
+
+# Read a CSV file of case/control steps, such as sim_ssf_rf1_beta1_1.csv, into a dict
+# of columns keyed by the names in its header
+def read_ssf_table(filename):
+    infile = open(filename, 'r')
+    names = [name.strip().strip('"') for name in infile.readline().split(',')]
+    values = numpy.loadtxt(infile, delimiter=',', ndmin=2)
+    infile.close()
+    return dict((name, values[:,column]) for column, name in enumerate(names))
+
+
+# Fit the conditional logistic regression of observed (1 for an observed step, 0 for a
+# control) on the columns of covariates (an n x k array), with strata giving the stratum
+# of each row.  Iterates until the log-likelihood changes by less than tolerance
+# (relative), halving the step whenever it would decrease.
+def clogit(observed, strata, covariates, tolerance=1e-9, max_iterations=50):
+    observed = numpy.asarray(observed, dtype=numpy.float64)
+    covariates = numpy.asarray(covariates, dtype=numpy.float64)
+    if covariates.ndim == 1:
+        covariates = covariates[:,numpy.newaxis]
+    # Sort the rows by stratum, so that each stratum is one contiguous block
+    order = numpy.argsort(strata, kind='stable')
+    observed = observed[order]
+    covariates = covariates[order]
+    sorted_strata = numpy.asarray(strata)[order]
+    starts = numpy.flatnonzero(numpy.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    # Number of observed steps in each stratum, and the sum of their covariates
+    events = numpy.add.reduceat(observed, starts)
+    observed_sum = numpy.dot(observed, covariates)
+    # Outer products of the covariates of each row, for the per-stratum covariances
+    no_covariates = covariates.shape[1]
+    outer = (covariates[:,:,numpy.newaxis]*covariates[:,numpy.newaxis,:]).reshape((len(covariates), -1))
+
+    def loglik_parts(beta):
+        eta = numpy.dot(covariates, beta)
+        # Log-sum-exp of eta over each stratum, shifted by the stratum maximum for stability
+        eta_max = numpy.maximum.reduceat(eta, starts)
+        sizes = numpy.diff(numpy.r_[starts, len(eta)])
+        weights = numpy.exp(eta - numpy.repeat(eta_max, sizes))
+        weight_sums = numpy.add.reduceat(weights, starts)
+        loglik = numpy.dot(observed, eta) - numpy.dot(events, eta_max + numpy.log(weight_sums))
+        return loglik, weights, weight_sums
+
+    beta = numpy.zeros(no_covariates)
+    loglik, weights, weight_sums = loglik_parts(beta)
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iterations+1):
+        # Weighted means and second moments of the covariates in each stratum
+        means = numpy.add.reduceat(weights[:,numpy.newaxis]*covariates, starts)/weight_sums[:,numpy.newaxis]
+        moments = numpy.add.reduceat(weights[:,numpy.newaxis]*outer, starts)/weight_sums[:,numpy.newaxis]
+        gradient = observed_sum - numpy.dot(events, means)
+        covariances = moments.reshape((-1, no_covariates, no_covariates)) - means[:,:,numpy.newaxis]*means[:,numpy.newaxis,:]
+        information = numpy.tensordot(events, covariances, axes=1)
+        step = numpy.linalg.solve(information, gradient)
+        # Halve the step until the log-likelihood does not decrease
+        for halving in range(30):
+            new_loglik, new_weights, new_weight_sums = loglik_parts(beta + step)
+            if new_loglik >= loglik - 1e-12*abs(loglik):
+                break
+            step /= 2
+        beta = beta + step
+        change = abs(new_loglik - loglik)
+        loglik, weights, weight_sums = new_loglik, new_weights, new_weight_sums
+        if change <= tolerance*max(abs(loglik), 1):
+            converged = True
+            break
+
+    # Standard errors from the information matrix at the estimate
+    means = numpy.add.reduceat(weights[:,numpy.newaxis]*covariates, starts)/weight_sums[:,numpy.newaxis]
+    moments = numpy.add.reduceat(weights[:,numpy.newaxis]*outer, starts)/weight_sums[:,numpy.newaxis]
+    covariances = moments.reshape((-1, no_covariates, no_covariates)) - means[:,:,numpy.newaxis]*means[:,numpy.newaxis,:]
+    information = numpy.tensordot(events, covariances, axes=1)
+    std_errors = numpy.sqrt(numpy.diag(numpy.linalg.inv(information)))
+    return ClogitFit(beta, std_errors, loglik, iteration, converged)
+
+
+# Selection-free lambda from the observed step lengths and the step-length coefficient
+# (Forester et al. 2009)
+def forester_lambda(observed_step_lengths, step_length_coefficient):
+    return 1/numpy.mean(observed_step_lengths) - step_length_coefficient
+
+
+# Fit Observed ~ resource + StepLength + strata(strata), as htsu_bm_from_ssa.R does, and
+# return beta (the resource coefficient), the corrected lambda and the full fit
+def fit_step_selection(table, resource_column='resource', step_column='StepLength'):
+    covariates = numpy.column_stack([table[resource_column], table[step_column]])
+    fit = clogit(table['Observed'], table['strata'], covariates)
+    observed_steps = table[step_column][table['Observed'] == 1]
+    lambda_val = forester_lambda(observed_steps, fit.coefficients[1])
+    return fit.coefficients[0], lambda_val, fit
+
+
+if __name__ == '__main__':
+    table = read_ssf_table(sys.argv[1])
+    beta, lambda_val, fit = fit_step_selection(table)
+    sys.stdout.write("Converged: %s after %i iterations\n" % (fit.converged, fit.iterations))
+    sys.stdout.write("Log-likelihood: %g\n" % fit.loglik)
+    sys.stdout.write("resource coefficient: %g (standard error %g)\n" % (fit.coefficients[0], fit.std_errors[0]))
+    sys.stdout.write("StepLength coefficient: %g (standard error %g)\n" % (fit.coefficients[1], fit.std_errors[1]))
+    sys.stdout.write("beta: %g\n" % beta)
+    sys.stdout.write("lambda: %g\n" % lambda_val)
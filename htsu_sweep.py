@@ -0,0 +1,201 @@
+###############################################################################
+# Name: htsu_sweep.py
+#
+# Purpose: Sweep the strength of interaction, a, for interacting individuals (see
+#          htsu_interact.py) and write the file plotted by htsu_fig4.py.  Each line
+#          of the output has four columns:
+#
+#            a, segregation (avoidance of strength a), aggregation (attraction of
+#            strength a, increasing a), aggregation (attraction, decreasing a)
+#
+#          with NA in the last column where a is outside the backward branch.  The
+#          forward branches can be warm-started, so each a starts from the final
+#          state at the previous a rather than from scratch, and the backward branch
+#          always is, starting from the most aggregated state and decreasing a, which
+#          is what shows any hysteresis.  Runs are spread over a pool of processes:
+#          one per (branch, replicate) when warm-starting, otherwise one per
+#          (branch, a, replicate).  Replicates are averaged.
+#
+#          The extent of segregation or aggregation is measured from the
+#          occurrence distributions (ODs) at the end of each run, by default as
+#          100 times the mean overlap (sum over cells of the smaller OD) of each pair
+#          of individuals, for both, as in htsu_plot_bif.inp: for individuals that do
+#          not interact this averages about 16.5 (the RW average drawn by
+#          htsu_fig4.py).  Other measures can be given to sweep as functions of the
+#          array of ODs.
+#
+# Usage: To run this, use the following command
+#   python htsu_sweep.py random_field_100.inp 0 2 20000 10000 1.5 3.5 0.05 1.9 htsu_plot_bif.inp
+#
+# The first parameter is random_field_100.inp, which gives the resource layer
+# The second parameter (0) corresponds to beta_R from Equation (S.2) in Supplementary Appendix A
+# The third parameter (2) is the number of individuals
+# The fourth parameter (20000) is the number of steps simulated at each value of a
+# The fifth parameter (10000) is the number of steps that each OD is calculated over
+# The sixth to eighth parameters (1.5 3.5 0.05) are the smallest and largest a, and the increment
+# The ninth parameter (1.9) is the smallest a on the backward branch
+# The tenth parameter (htsu_plot_bif.inp) is the output file
+# Optional eleventh and twelfth parameters give the number of processes (default: all
+# cores) and the number of replicates (default 1); an optional thirteenth parameter,
+# cold, starts every forward run from scratch instead of warm-starting
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys, multiprocessing
+import numpy
+import htsu_layer, htsu_interact
+
+# Sign of beta_interact for each branch: avoidance for segregation, attraction for aggregation
+BRANCH_SIGNS = {'segregation': 1, 'aggregation': -1, 'backward': -1}
+
+
+# Mean overlap, sum over cells of min(OD_i, OD_j), over pairs of individuals i < j.  The
+# ODs are updated by adding and subtracting 1/no_steps_for_od, so cells that have been
+# left drift slightly below zero; they are clamped to zero first.
+def mean_overlap(occurrence_dist):
+    occurrence_dist = numpy.maximum(occurrence_dist, 0)
+    overlaps = [numpy.minimum(occurrence_dist[i], occurrence_dist[j]).sum()
+                for i in range(len(occurrence_dist)) for j in range(i+1, len(occurrence_dist))]
+    return numpy.mean(overlaps)
+
+
+# Extents of aggregation and segregation, both on the scale of Figure 4
+def aggregation_extent(occurrence_dist):
+    return 100*mean_overlap(occurrence_dist)
+
+
+def segregation_extent(occurrence_dist):
+    return 100*mean_overlap(occurrence_dist)
+
+
+# Run one branch over the values of a in beta_vals, in order.  If warm_start, the
+# individuals carry on from the state at the previous a; otherwise each a starts afresh
+# (in which case beta_vals normally has only one value).  Returns the measures at each a.
+def run_branch(task):
+    (branch, beta_vals, exp_layer, no_indivs, step_no, no_steps_for_od, warm_start, seed, measures) = task
+    rng = numpy.random.default_rng(seed)
+    aggregation_measure, segregation_measure = measures
+    measure = segregation_measure if branch == 'segregation' else aggregation_measure
+    results = []
+    walkers = None
+    for beta in beta_vals:
+        if walkers is None or not warm_start:
+            walkers = htsu_interact.InteractingWalkers(exp_layer, no_indivs, 0, no_steps_for_od, seed=rng)
+        walkers.beta_interact = BRANCH_SIGNS[branch]*beta
+        walkers.run(step_no, burn_in=step_no)
+        results += [measure(walkers.occurrence_dist)]
+    return results
+
+
+# Sweep a over beta_vals.  The backward branch runs from the largest a down to back_min,
+# starting from the state at the end of a forward aggregation run at the largest a.
+# Returns a list of (a, segregation, aggregation, backward aggregation or None).
+# measures is (aggregation measure, segregation measure).
+def sweep(exp_layer, no_indivs, step_no, no_steps_for_od, beta_vals, back_min, processes=None,
+          replicates=1, warm_start=True, seed=None, measures=(aggregation_extent, segregation_extent)):
+    beta_vals = list(beta_vals)
+    back_vals = [beta for beta in reversed(beta_vals) if beta >= back_min - 1e-12]
+    # The backward branch first settles at the largest a, then steps down
+    back_run = [back_vals[0]] + back_vals if back_vals else []
+
+    tasks = []
+    keys = []
+    for replicate in range(replicates):
+        for branch in ('segregation', 'aggregation'):
+            if warm_start:
+                tasks += [(branch, beta_vals)]
+                keys += [(branch, None, replicate)]
+            else:
+                for index in range(len(beta_vals)):
+                    tasks += [(branch, beta_vals[index:index+1])]
+                    keys += [(branch, index, replicate)]
+        if back_run:
+            tasks += [('backward', back_run)]
+            keys += [('backward', None, replicate)]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(tasks))
+    tasks = [task + (exp_layer, no_indivs, step_no, no_steps_for_od, True if task[0] == 'backward' else warm_start,
+                     seeds[index], measures) for index, task in enumerate(tasks)]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        outputs = pool.map(run_branch, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Average over replicates
+    totals = {'segregation': numpy.zeros(len(beta_vals)), 'aggregation': numpy.zeros(len(beta_vals)),
+              'backward': numpy.zeros(len(back_vals))}
+    for (branch, index, replicate), output in zip(keys, outputs):
+        if branch == 'backward':
+            # Drop the settling run at the largest a
+            totals[branch] += output[1:]
+        elif index is None:
+            totals[branch] += output
+        else:
+            totals[branch][index] += output[0]
+    back_dict = dict(zip(back_vals, totals['backward']/replicates))
+    return [(beta_vals[index], totals['segregation'][index]/replicates,
+             totals['aggregation'][index]/replicates, back_dict.get(beta_vals[index]))
+            for index in range(len(beta_vals))]
+
+
+# Write the output of sweep in the format read by htsu_fig4.py
+def write_bif(filename, rows):
+    outfile = open(filename, 'w')
+    for beta, seg, agg_fwd, agg_back in rows:
+        back_str = "NA" if agg_back is None else "%g" % agg_back
+        outfile.write("%g\t%g\t%g\t%s\n" % (beta, seg, agg_fwd, back_str))
+    outfile.close()
+
+
+if __name__ == '__main__':
+    # File containing layer
+    curr_arg = 1
+    layerfile = sys.argv[curr_arg]
+    # beta_r-value (strength of resource effect)
+    curr_arg += 1
+    beta_r = float(sys.argv[curr_arg])
+    # Number of individuals
+    curr_arg += 1
+    no_indivs = int(sys.argv[curr_arg])
+    # Number of steps at each value of a
+    curr_arg += 1
+    step_no = int(sys.argv[curr_arg])
+    # Number of steps that OD is calculated over
+    curr_arg += 1
+    no_steps_for_od = int(sys.argv[curr_arg])
+    # Range of a
+    curr_arg += 1
+    beta_min = float(sys.argv[curr_arg])
+    curr_arg += 1
+    beta_max = float(sys.argv[curr_arg])
+    curr_arg += 1
+    beta_inc = float(sys.argv[curr_arg])
+    # Smallest a on the backward branch
+    curr_arg += 1
+    back_min = float(sys.argv[curr_arg])
+    # Output file
+    curr_arg += 1
+    outfile = sys.argv[curr_arg]
+    # Number of processes (optional)
+    curr_arg += 1
+    processes = int(sys.argv[curr_arg]) if len(sys.argv) > curr_arg else None
+    # Number of replicates (optional)
+    curr_arg += 1
+    replicates = int(sys.argv[curr_arg]) if len(sys.argv) > curr_arg else 1
+    # Warm or cold starts (optional)
+    curr_arg += 1
+    warm_start = not (len(sys.argv) > curr_arg and sys.argv[curr_arg] == 'cold')
+
+    # Get the R-values and also exp(beta_R*R(x))
+    r_array = htsu_layer.load_layer(layerfile)
+    exp_layer = htsu_layer.exp_layer(r_array, beta_r)
+
+    beta_vals = [beta_min + index*beta_inc for index in range(int(round((beta_max - beta_min)/beta_inc)) + 1)]
+    rows = sweep(exp_layer, no_indivs, step_no, no_steps_for_od, beta_vals, back_min, processes=processes,
+                 replicates=replicates, warm_start=warm_start)
+    write_bif(outfile, rows)
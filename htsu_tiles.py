@@ -0,0 +1,205 @@
+###############################################################################
+# Name: htsu_tiles.py
+#
+# Purpose: Tiled store for layers too large to hold in memory (e.g. 20000x20000
+#          rasters).  write_tiles splits a layer into square tiles of float32 values,
+#          one .npy file each, reading the layer a band of tile_size rows at a time, so
+#          the whole layer is never in memory.  A TiledLayer memory-maps the tiles as
+#          they are needed and keeps at most max_tiles of them, dropping the least
+#          recently used.  It is indexed like a 2D array, layer[y0:y1, x0:x1], so it
+#          can be given to htsu_walk.simulate_path and htsu_walk.CorrelatedWalk in place
+#          of the grid of habitat weights: each step pages in only the tiles under the
+#          kernel window, and memory is bounded by max_tiles tiles rather than the size
+#          of the landscape.  The step-length kernel must then be truncated (tolerance,
+#          see htsu_kernel.StepKernel), so that the window is much smaller than the
+#          landscape.
+#
+#          With beta given, the tiles are turned into habitat weights exp(beta*Z) as they
+#          are paged in, so each tile is exponentiated once while it is held rather
+#          than on every step.
+#
+# Usage: To convert a layer, use the following command
+#   python htsu_tiles.py random_field_100.inp random_field_100.tiles 32
+# which writes tiles of 32x32 cells to the directory random_field_100.tiles, or, from Python,
+#   from htsu_tiles import TiledLayer
+#   weights = TiledLayer('random_field_100.tiles', beta=1.5)
+#   loc_x, loc_y = htsu_walk.simulate_path(weights, htsu_kernel.StepKernel(0.2, 100, 100, tolerance=1e-6), 1000, (50, 50))
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import os, sys, json, itertools, collections
+import numpy
+
+# Default side of a tile, in cells
+TILE_SIZE = 512
+
+# Default number of tiles held at once
+MAX_TILES = 64
+
+# File in the tile directory describing the layer
+META_FILE = 'tiles.json'
+
+# Tolerance on the mass of the step-length kernel discarded by truncating it, used by the
+# scripts for tiled layers when none is given
+KERNEL_TOLERANCE = 1e-6
+
+# Largest side, in cells, of the overview of a tiled layer that the scripts plot
+OVERVIEW_SIZE = 1000
+
+
+# Name of the file holding tile (tile_y, tile_x)
+def tile_name(directory, tile_y, tile_x):
+    return os.path.join(directory, 'tile_%i_%i.npy' % (tile_y, tile_x))
+
+
+# Bands of up to tile_size rows of a layer file: a tab-separated .inp file, read a band
+# at a time, or a .npy file, memory-mapped
+def layer_bands(layerfile, tile_size):
+    if layerfile.endswith('.npy'):
+        array = numpy.load(layerfile, mmap_mode='r')
+        for row in range(0, len(array), tile_size):
+            yield array[row:row+tile_size]
+        return
+    infile = open(layerfile, 'r')
+    while True:
+        lines = list(itertools.islice(infile, tile_size))
+        if not lines:
+            break
+        yield numpy.loadtxt(lines, dtype=numpy.float64, ndmin=2)
+    infile.close()
+
+
+# Split the layer in layerfile into tiles of tile_size x tile_size cells (smaller along the
+# right and top edges) in directory
+def write_tiles(layerfile, directory, tile_size=TILE_SIZE):
+    os.makedirs(directory, exist_ok=True)
+    box_width = None
+    box_height = 0
+    for tile_y, band in enumerate(layer_bands(layerfile, tile_size)):
+        if box_width is None:
+            box_width = band.shape[1]
+        elif band.shape[1] != box_width:
+            raise ValueError("Rows of %s have %i and %i columns" % (layerfile, box_width, band.shape[1]))
+        for tile_x in range(0, (box_width + tile_size - 1)//tile_size):
+            numpy.save(tile_name(directory, tile_y, tile_x),
+                       numpy.asarray(band[:, tile_x*tile_size:(tile_x+1)*tile_size], dtype=numpy.float32))
+        box_height += len(band)
+    outfile = open(os.path.join(directory, META_FILE), 'w')
+    json.dump({'box_width': box_width, 'box_height': box_height, 'tile_size': tile_size,
+               'dtype': 'float32', 'layerfile': layerfile}, outfile, indent=1)
+    outfile.close()
+
+
+class TiledLayer:
+
+    # Open the tiles in directory (written by write_tiles), holding at most max_tiles at
+    # once, which should be more than lie under one kernel window.  With beta given, the
+    # values are the habitat weights exp(beta*Z) rather than Z.
+    def __init__(self, directory, beta=None, max_tiles=MAX_TILES):
+        self.directory = directory
+        infile = open(os.path.join(directory, META_FILE), 'r')
+        meta = json.load(infile)
+        infile.close()
+        self.box_width = meta['box_width']
+        self.box_height = meta['box_height']
+        self.shape = (self.box_height, self.box_width)
+        self.tile_size = meta['tile_size']
+        self.beta = beta
+        self.dtype = numpy.dtype(numpy.float32)
+        self.max_tiles = max_tiles
+        self.tiles = collections.OrderedDict()
+        self.loads = 0
+
+    def __len__(self):
+        return self.box_height
+
+    # Tile (tile_y, tile_x), paging it in and dropping the least recently used tile if
+    # too many are then held
+    def tile(self, tile_y, tile_x):
+        key = (tile_y, tile_x)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+        tile = numpy.load(tile_name(self.directory, tile_y, tile_x), mmap_mode='r')
+        if self.beta is not None:
+            tile = numpy.exp(self.beta*tile)
+        self.tiles[key] = tile
+        self.loads += 1
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    # Rows y0:y1 and columns x0:x1 (clipped to the layer) as an array, pieced together
+    # from the tiles that they cover
+    def window(self, y0, y1, x0, x1):
+        y0, y1 = max(0, y0), min(self.box_height, y1)
+        x0, x1 = max(0, x0), min(self.box_width, x1)
+        size = self.tile_size
+        values = numpy.empty((max(0, y1-y0), max(0, x1-x0)), dtype=self.dtype)
+        for tile_y in range(y0//size, (y1 + size - 1)//size):
+            for tile_x in range(x0//size, (x1 + size - 1)//size):
+                tile = self.tile(tile_y, tile_x)
+                # Part of the window inside this tile, in layer coordinates
+                row0, row1 = max(y0, tile_y*size), min(y1, (tile_y+1)*size)
+                col0, col1 = max(x0, tile_x*size), min(x1, (tile_x+1)*size)
+                values[row0-y0:row1-y0, col0-x0:col1-x0] = tile[row0-tile_y*size:row1-tile_y*size,
+                                                                col0-tile_x*size:col1-tile_x*size]
+        return values
+
+    # layer[y0:y1, x0:x1], layer[y, x] or layer[y] (a row), as for a 2D array (slices
+    # with steps other than 1 are not supported)
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        bounds = []
+        for index, length in zip(key, self.shape):
+            if isinstance(index, slice):
+                if index.step not in (None, 1):
+                    raise IndexError("TiledLayer does not support slices with steps")
+                start, stop, step = index.indices(length)
+                bounds += [(start, max(start, stop))]
+            else:
+                index = int(index)
+                if index < 0:
+                    index += length
+                if not 0 <= index < length:
+                    raise IndexError("Index %i out of range for length %i" % (index, length))
+                bounds += [(index, index+1)]
+        values = self.window(bounds[0][0], bounds[0][1], bounds[1][0], bounds[1][1])
+        # Drop the axes that were indexed by integers
+        return values[tuple(0 if not isinstance(index, slice) else slice(None) for index in key)]
+
+    # Every step-th cell in each direction, read a tile at a time (e.g. for plotting)
+    def overview(self, step):
+        values = numpy.empty(((self.box_height + step - 1)//step, (self.box_width + step - 1)//step),
+                             dtype=self.dtype)
+        size = self.tile_size
+        for tile_y in range((self.box_height + size - 1)//size):
+            for tile_x in range((self.box_width + size - 1)//size):
+                # First cell of the tile on the grid of every step-th cell
+                row0 = -(-tile_y*size//step)*step
+                col0 = -(-tile_x*size//step)*step
+                if row0 >= min(self.box_height, (tile_y+1)*size) or col0 >= min(self.box_width, (tile_x+1)*size):
+                    continue
+                part = self.tile(tile_y, tile_x)[row0-tile_y*size::step, col0-tile_x*size::step]
+                values[row0//step:row0//step+part.shape[0], col0//step:col0//step+part.shape[1]] = part
+        return values
+
+
+# Step between the cells of the overview of a layer of the given shape that the scripts plot
+def overview_step(shape):
+    return max(1, -(-max(shape)//OVERVIEW_SIZE))
+
+
+if __name__ == '__main__':
+    # Layer file to convert, directory for the tiles, and side of a tile (optional)
+    curr_arg = 1
+    layerfile = sys.argv[curr_arg]
+    curr_arg += 1
+    directory = sys.argv[curr_arg]
+    curr_arg += 1
+    tile_size = int(sys.argv[curr_arg]) if len(sys.argv) > curr_arg else TILE_SIZE
+    write_tiles(layerfile, directory, tile_size)
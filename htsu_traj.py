@@ -0,0 +1,286 @@
+###############################################################################
+# Name: htsu_traj.py
+#
+# Purpose: Compact binary files of simulated trajectories.  A file holds
+#
+#            MAGIC, the length of the header (uint32), the header (JSON), then chunks
+#
+#          where the header records the column names and types, the number of
+#          individuals, and metadata such as the parameters, seed, burn in and
+#          subsampling used, and each chunk is the number of rows in it (uint32)
+#          followed by each column in turn as a contiguous array (int32 for
+#          positions, float32 for continuous values; little-endian).  Rows are held
+#          in memory and written a chunk at a time, rather than one write per
+#          position, and are read back without any parsing.
+#
+#          As in htsu_fig3.py, rows are numbered from 1, and subsampling is applied
+#          when writing: row number row is kept if row > start_val and
+#          row % subsampling == 0.  TextTrajectoryWriter has the same interface and
+#          writes the tab-separated text files used before (e.g. to stdout), and
+#          export_text converts a binary file to that text format.
+#
+#          iter_chunks streams either kind of file (binary, or text such as the .out
+#          files) a chunk at a time into arrays.  The start_val/subsampling rule is
+#          applied to the row numbers before anything is parsed, so only the rows kept
+#          are ever converted.  read_positions reads several binary files at once on a
+#          pool of threads: reading them and converting with numpy.frombuffer mostly
+#          runs outside the interpreter lock (and threads, unlike processes, can be
+#          started from scripts without a __main__ guard).  Text files are parsed in the
+#          calling thread meanwhile, one after another, as parsing holds the lock.
+#
+# Usage: from htsu_traj import TrajectoryWriter, read_trajectory
+#   writer = TrajectoryWriter('path.traj', ['x', 'y'], metadata={'beta_r': 1.5, 'seed': 1})
+#   writer.write_row((loc_x, loc_y))
+#   writer.close()
+#   header, columns = read_trajectory('path.traj')   # columns['x'], columns['y']
+#   positions = read_positions(['a.out', 'b.traj'], start_val=1000, subsampling=10)
+#   x_array, y_array = positions[0][1]   # positions of individual 1 in a.out
+# or, to export to text,
+#   python htsu_traj.py path.traj path.out
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import sys, json, struct, itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+
+# First bytes of every trajectory file, including the format version
+MAGIC = b'HTSUTRJ1'
+
+# Number of rows held in memory before a chunk is written
+CHUNK_ROWS = 65536
+
+
+# Names of the position columns for no_indivs individuals: x0, y0, x1, y1, ...
+def position_columns(no_indivs):
+    columns = []
+    for indiv in range(no_indivs):
+        columns += ['x%i' % indiv, 'y%i' % indiv]
+    return columns
+
+
+class TrajectoryWriter:
+
+    # Open filename for writing rows with the given column names.  dtypes is one type
+    # for all the columns, or a list with one for each ('int32' or 'float32').
+    # metadata is any JSON-serialisable dict, stored in the header along with the
+    # number of individuals, start_val and subsampling.
+    def __init__(self, filename, columns, dtypes='int32', metadata=None, no_indivs=None,
+                 start_val=0, subsampling=1, chunk_rows=CHUNK_ROWS):
+        if isinstance(dtypes, str):
+            dtypes = [dtypes]*len(columns)
+        self.dtypes = [numpy.dtype(dtype).newbyteorder('<') for dtype in dtypes]
+        self.setup_rows(columns, start_val, subsampling, chunk_rows)
+        header = {'columns': self.columns,
+                  'dtypes': [dtype.name for dtype in self.dtypes],
+                  'no_indivs': no_indivs if no_indivs is not None else len(columns)//2,
+                  'start_val': start_val,
+                  'subsampling': subsampling,
+                  'metadata': metadata or {}}
+        header_bytes = json.dumps(header).encode('utf-8')
+        self.outfile = open(filename, 'wb')
+        self.outfile.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+
+    # Set up the row numbering and the buffer of rows held in memory
+    def setup_rows(self, columns, start_val, subsampling, chunk_rows):
+        self.columns = list(columns)
+        self.start_val = start_val
+        self.subsampling = subsampling
+        self.chunk_rows = chunk_rows
+        self.row = 0
+        self.rows_written = 0
+        self.buffer = numpy.zeros((chunk_rows, len(columns)), dtype=numpy.float64)
+        self.buffered = 0
+
+    # Write one row of values (one for each column)
+    def write_row(self, values):
+        self.row += 1
+        if self.row > self.start_val and self.row % self.subsampling == 0:
+            self.buffer[self.buffered] = values
+            self.buffered += 1
+            if self.buffered == self.chunk_rows:
+                self.flush()
+
+    # Write consecutive rows at once, from an array of shape (rows, columns)
+    def write_rows(self, values):
+        values = numpy.asarray(values)
+        rows = self.row + numpy.arange(1, len(values)+1)
+        self.row += len(values)
+        values = values[(rows > self.start_val) & (rows % self.subsampling == 0)]
+        while len(values) > 0:
+            count = min(len(values), self.chunk_rows - self.buffered)
+            self.buffer[self.buffered:self.buffered+count] = values[:count]
+            self.buffered += count
+            values = values[count:]
+            if self.buffered == self.chunk_rows:
+                self.flush()
+
+    # Write the rows held in memory as one chunk
+    def flush(self):
+        if self.buffered == 0:
+            return
+        self.outfile.write(struct.pack('<I', self.buffered))
+        for column, dtype in enumerate(self.dtypes):
+            self.outfile.write(self.buffer[:self.buffered, column].astype(dtype).tobytes())
+        self.rows_written += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.outfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextTrajectoryWriter(TrajectoryWriter):
+
+    # As TrajectoryWriter, but write tab-separated text to the open stream outfile (e.g.
+    # sys.stdout), with no header.  fmt is the format of each value.
+    def __init__(self, outfile, columns, fmt='%i', start_val=0, subsampling=1, chunk_rows=CHUNK_ROWS):
+        self.fmt = fmt
+        self.setup_rows(columns, start_val, subsampling, chunk_rows)
+        self.outfile = outfile
+
+    def flush(self):
+        if self.buffered == 0:
+            return
+        numpy.savetxt(self.outfile, self.buffer[:self.buffered], fmt=self.fmt, delimiter='\t')
+        self.rows_written += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.outfile.flush()
+
+
+# Read the header of a trajectory file, returning it and the offset of the first chunk
+def read_header(filename):
+    infile = open(filename, 'rb')
+    magic = infile.read(len(MAGIC))
+    if magic != MAGIC:
+        infile.close()
+        raise ValueError("%s is not a trajectory file" % filename)
+    header_length = struct.unpack('<I', infile.read(4))[0]
+    header = json.loads(infile.read(header_length).decode('utf-8'))
+    infile.close()
+    return header, len(MAGIC) + 4 + header_length
+
+
+# Read a whole trajectory file, returning the header and a dict of column arrays
+def read_trajectory(filename):
+    header, offset = read_header(filename)
+    dtypes = [numpy.dtype(dtype).newbyteorder('<') for dtype in header['dtypes']]
+    chunks = [[] for column in header['columns']]
+    infile = open(filename, 'rb')
+    infile.seek(offset)
+    while True:
+        count_bytes = infile.read(4)
+        if len(count_bytes) < 4:
+            break
+        count = struct.unpack('<I', count_bytes)[0]
+        for column, dtype in enumerate(dtypes):
+            chunks[column] += [numpy.frombuffer(infile.read(count*dtype.itemsize), dtype=dtype)]
+    infile.close()
+    columns = {}
+    for column, name in enumerate(header['columns']):
+        columns[name] = numpy.concatenate(chunks[column]) if chunks[column] else numpy.zeros(0, dtypes[column])
+    return header, columns
+
+
+# Is filename a binary trajectory file (rather than text)?
+def is_binary(filename):
+    infile = open(filename, 'rb')
+    magic = infile.read(len(MAGIC))
+    infile.close()
+    return magic == MAGIC
+
+
+# Offsets into a block of count rows, numbered from first_row, of the rows kept by the
+# rule row > start_val and row % subsampling == 0
+def kept_rows(first_row, count, start_val, subsampling):
+    first_kept = max(first_row, start_val + 1)
+    first_kept += (-first_kept) % subsampling
+    return slice(first_kept - first_row, count, subsampling)
+
+
+# Stream the rows of a binary or text trajectory file kept by the start_val/subsampling
+# rule (rows numbered from 1 within the file), as 2D float64 arrays of at most about
+# chunk_rows rows each.  Text rows that are not kept are never parsed.
+def iter_chunks(filename, start_val=0, subsampling=1, chunk_rows=CHUNK_ROWS):
+    if is_binary(filename):
+        header, offset = read_header(filename)
+        dtypes = [numpy.dtype(dtype).newbyteorder('<') for dtype in header['dtypes']]
+        infile = open(filename, 'rb')
+        infile.seek(offset)
+        first_row = 1
+        while True:
+            count_bytes = infile.read(4)
+            if len(count_bytes) < 4:
+                break
+            count = struct.unpack('<I', count_bytes)[0]
+            rows = kept_rows(first_row, count, start_val, subsampling)
+            first_row += count
+            chunk = numpy.zeros((len(range(count)[rows]), len(dtypes)))
+            for column, dtype in enumerate(dtypes):
+                chunk[:,column] = numpy.frombuffer(infile.read(count*dtype.itemsize), dtype=dtype)[rows]
+            if len(chunk) > 0:
+                yield chunk
+        infile.close()
+    else:
+        infile = open(filename, 'r')
+        first_row = 1
+        while True:
+            lines = list(itertools.islice(infile, chunk_rows))
+            if not lines:
+                break
+            kept = lines[kept_rows(first_row, len(lines), start_val, subsampling)]
+            first_row += len(lines)
+            if kept:
+                values = numpy.array(''.join(kept).split(), dtype=numpy.float64)
+                yield values.reshape((len(kept), -1))
+        infile.close()
+
+
+# Read the kept rows of a trajectory file, returning a list with the (x_array, y_array)
+# of each individual, where columns 2*indiv and 2*indiv+1 are the positions of individual
+# indiv
+def read_file_positions(filename, start_val=0, subsampling=1):
+    chunks = list(iter_chunks(filename, start_val, subsampling))
+    table = numpy.concatenate(chunks) if chunks else numpy.zeros((0, 2))
+    return [(table[:,2*indiv], table[:,2*indiv+1]) for indiv in range(table.shape[1]//2)]
+
+
+# read_file_positions for each of filenames.  The binary files are read at the same time
+# on a pool of threads (one per file by default), while the text files are parsed in this
+# thread; threads=1 reads every file one after another.
+def read_positions(filenames, start_val=0, subsampling=1, threads=None):
+    read = lambda filename: read_file_positions(filename, start_val, subsampling)
+    binary = [is_binary(filename) for filename in filenames]
+    if threads == 1 or not any(binary):
+        return [read(filename) for filename in filenames]
+    executor = ThreadPoolExecutor(max_workers=threads or sum(binary))
+    try:
+        futures = [executor.submit(read, filename) if is_bin else None for filename, is_bin in zip(filenames, binary)]
+        texts = [None if is_bin else read(filename) for filename, is_bin in zip(filenames, binary)]
+        return [text if future is None else future.result() for future, text in zip(futures, texts)]
+    finally:
+        executor.shutdown()
+
+
+# Write a trajectory file as tab-separated text, one row per line, in column order
+def export_text(filename, textfile):
+    header, columns = read_trajectory(filename)
+    table = numpy.column_stack([columns[name] for name in header['columns']])
+    fmt = ['%i' if numpy.dtype(dtype).kind in 'iu' else '%g' for dtype in header['dtypes']]
+    numpy.savetxt(textfile, table, fmt=fmt, delimiter='\t')
+
+
+if __name__ == '__main__':
+    export_text(sys.argv[1], sys.argv[2])
@@ -0,0 +1,90 @@
+###############################################################################
+# Name: htsu_walk.py
+#
+# Purpose: Simulate a correlated step selection walk, Equation (4) of Supplementary
+#          Appendix A, with movement kernel
+#
+#            exp(-lambda*|x-z|) * w(z) * exp(kappa*cos(alpha_x-alpha_z)),
+#
+#          where w(z) is the habitat weight, alpha_x the bearing of the previous step
+#          and alpha_z the bearing of the step to z.  The step-length and von Mises
+#          factors come from an htsu_kernel.BearingKernelCache, so a step is one
+#          table lookup, one multiplication by the habitat weights and one draw, as
+#          for an uncorrelated walk, with no trigonometry.  The bearing is rounded to
+#          one of n_bins bins, with relative error at most
+#          CorrelatedWalk.cache.max_error in each weight.  If the animal does not
+#          move, its bearing is unchanged.
+#
+#          simulate_path simulates the uncorrelated walk (kappa=0), with kernel
+#          exp(-lambda*|x-z|) * w(z), returning the locations without plotting them.
+#
+# Usage: from htsu_walk import CorrelatedWalk
+#   walk = CorrelatedWalk(exp_layer, 0.2, 2, n_bins=360)
+#   loc_x, loc_y = walk.simulate(1000, (50, 50), start_bearing=0)
+# or
+#   loc_x, loc_y = htsu_walk.simulate_path(exp_layer, htsu_kernel.StepKernel(0.2, 100, 100), 1000, (50, 50))
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import random
+import htsu_kernel, htsu_sample
+
+
+# Simulate step_no locations (including the start, start=(x,y)) of the uncorrelated walk on
+# the grid of habitat weights w, with the step-length term from kernel (an
+# htsu_kernel.StepKernel), returning lists of the x- and y-values.  random_no is the source
+# of uniform random numbers, and visit(x, y), if given, is called with each new location.
+def simulate_path(weights, kernel, step_no, start, random_no=random.random, visit=None):
+    box_height, box_width = weights.shape
+    loc_x = [start[0]]
+    loc_y = [start[1]]
+    for step in range(1, step_no):
+        # Calculate the (unnormalised) movement kernel weights
+        kernel_window, (y0, y1, x0, x1) = kernel.window(loc_x[step-1], loc_y[step-1], box_width, box_height)
+        step_weights = kernel_window*weights[y0:y1, x0:x1]
+
+        # Find the x- and y-values corresponding to a random draw
+        y_val, x_val = htsu_sample.draw_cell(step_weights, random_no())
+        loc_x += [x0 + x_val]
+        loc_y += [y0 + y_val]
+        if visit is not None:
+            visit(loc_x[step], loc_y[step])
+    return loc_x, loc_y
+
+
+class CorrelatedWalk:
+
+    # Set up the walk on the grid of habitat weights w.  tolerance truncates the
+    # step-length kernel (see htsu_kernel.StepKernel), and n_bins or bearing_tolerance
+    # set the rounding of the bearing (see htsu_kernel.BearingKernelCache).
+    def __init__(self, weights, lambda_val, kappa, n_bins=None, bearing_tolerance=None, tolerance=None):
+        self.weights = weights
+        self.box_height, self.box_width = weights.shape
+        self.kernel = htsu_kernel.StepKernel(lambda_val, self.box_width, self.box_height, tolerance=tolerance)
+        self.cache = htsu_kernel.BearingKernelCache(self.kernel, kappa, n_bins=n_bins,
+                                                    tolerance=bearing_tolerance)
+
+    # Simulate step_no locations (including the start, start=(x,y)), returning lists of
+    # the x- and y-values.  random_no is the source of uniform random numbers.
+    def simulate(self, step_no, start, start_bearing=0, random_no=random.random):
+        loc_x = [start[0]]
+        loc_y = [start[1]]
+        alpha_x = start_bearing
+        for step in range(1, step_no):
+            # Calculate the (unnormalised) movement kernel weights
+            kernel_window, (y0, y1, x0, x1) = self.cache.window(alpha_x, loc_x[step-1], loc_y[step-1],
+                                                                self.box_width, self.box_height)
+            weights = kernel_window*self.weights[y0:y1, x0:x1]
+
+            # Find the x- and y-values corresponding to a random draw
+            y_val, x_val = htsu_sample.draw_cell(weights, random_no())
+            loc_x += [x0 + x_val]
+            loc_y += [y0 + y_val]
+            # The bearing of this step, looked up by its offset
+            if (loc_x[step], loc_y[step]) != (loc_x[step-1], loc_y[step-1]):
+                alpha_x = self.cache.offset_bearing[loc_y[step]-loc_y[step-1]+self.cache.radius_y,
+                                                    loc_x[step]-loc_x[step-1]+self.cache.radius_x]
+        return loc_x, loc_y
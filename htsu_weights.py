@@ -0,0 +1,71 @@
+###############################################################################
+# Name: htsu_weights.py
+#
+# Purpose: Compile the static part of a step selection model into one grid of
+#          habitat weights,
+#
+#            w(z) = exp(beta_1*Z_1(z) + ... + beta_n*Z_n(z) - beta_C*|z-x_C|),
+#
+#          for any number of covariate layers Z_i with coefficients beta_i, and
+#          (optionally) attraction of strength beta_C to the central place x_C.  The
+#          log-weights are summed layer by layer into one array and exponentiated
+#          once, so the samplers (htsu_walk.py, htsu_ensemble.py, htsu_interact.py),
+#          the UD calculations (htsu_bm.py) and the master equation (htsu_me.py), which
+#          all take a single grid of weights, cost the same per step whatever the
+#          number of covariates.
+#
+#          The kernels only depend on the weights up to a constant factor, so
+#          normalise=True divides them by the largest, which keeps exp from
+#          overflowing when the log-weights are large.
+#
+# Usage: from htsu_weights import compile_weights
+#   habitat = compile_weights(['random_field_100.inp', r_array**2], [1.5, -0.3])
+#   habitat = compile_weights([r_array], [1.5], centre=(50, 50), beta_c=0.2)
+#   ud = htsu_bm.bm_ud(habitat.weights, 0.2)
+#
+# Author: Jonathan R. Potts
+#
+# Feel free to share and adapt, but giving appropriate credit
+###############################################################################
+
+import collections
+import numpy
+import htsu_layer
+
+# Compiled habitat: log_weights[y][x] and weights[y][x] = exp(log_weights[y][x])
+HabitatWeights = collections.namedtuple('HabitatWeights', ['log_weights', 'weights'])
+
+
+# Sum of betas[i]*layers[i] - beta_c*|x-centre| for every cell x.  Each layer is a 2D array
+# or the name of a layer file (see htsu_layer.load_layer), and all must have the same shape.
+def log_weights(layers, betas, centre=None, beta_c=0):
+    if len(layers) != len(betas):
+        raise ValueError("%i covariate layers but %i coefficients" % (len(layers), len(betas)))
+    if len(layers) == 0:
+        raise ValueError("No covariate layers to take the shape of the landscape from")
+    total = None
+    for layer, beta in zip(layers, betas):
+        if isinstance(layer, str):
+            layer = htsu_layer.load_layer(layer)
+        layer = numpy.asarray(layer, dtype=numpy.float64)
+        if total is None:
+            total = beta*layer
+        elif layer.shape != total.shape:
+            raise ValueError("Covariate layer of shape %s does not match %s" % (layer.shape, total.shape))
+        else:
+            total += beta*layer
+    if beta_c != 0:
+        if centre is None:
+            raise ValueError("Central-place attraction needs a centre")
+        box_height, box_width = total.shape
+        total -= beta_c*htsu_layer.central_place_distance(box_width, box_height, centre[0], centre[1])
+    return total
+
+
+# Compile the covariate layers and central-place term (as for log_weights) into a
+# HabitatWeights.  With normalise=True the weights are divided by the largest.
+def compile_weights(layers, betas, centre=None, beta_c=0, normalise=False):
+    compiled = log_weights(layers, betas, centre, beta_c)
+    if normalise:
+        compiled -= compiled.max()
+    return HabitatWeights(compiled, numpy.exp(compiled))